@@ -14,6 +14,30 @@ API_HASH = os.getenv("API_HASH")
 # Database Configuration
 MONGO_URI = os.getenv("MONGO_URI")
 DATABASE_NAME = os.getenv("DATABASE_NAME")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))  # 5 minutes
+
+# Write-behind buffer for user activity recorded on /start
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", "5"))  # seconds
+USER_FLUSH_SIZE = int(os.getenv("USER_FLUSH_SIZE", "500"))
+USER_DEDUPE_WINDOW = float(os.getenv("USER_DEDUPE_WINDOW", "300"))  # seconds
+
+# In-process cache of file and batch metadata; unknown links are cached for
+# the (shorter) negative TTL. TTLs in seconds, size in bytes
+METADATA_CACHE_SIZE = int(os.getenv("METADATA_CACHE_SIZE", "20000"))
+METADATA_CACHE_BYTES = int(os.getenv("METADATA_CACHE_BYTES", str(32 * 1024 * 1024)))
+METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", "300"))
+METADATA_CACHE_NEGATIVE_TTL = float(os.getenv("METADATA_CACHE_NEGATIVE_TTL", "30"))
+
+# Seconds between cache invalidation polls when Mongo has no change streams
+INVALIDATION_POLL_INTERVAL = float(os.getenv("INVALIDATION_POLL_INTERVAL", "5"))
+
+# Download accounting is coalesced per file and flushed once per tick
+DELIVERY_FLUSH_INTERVAL = float(os.getenv("DELIVERY_FLUSH_INTERVAL", "1"))  # seconds
+DELIVERY_FLUSH_SIZE = int(os.getenv("DELIVERY_FLUSH_SIZE", "200"))
+# How long a delivery record outlives its delete_at before the TTL index drops it
+DELIVERY_RECORD_GRACE = int(os.getenv("DELIVERY_RECORD_GRACE", "86400"))  # seconds
 
 # Channel Configuration
 DB_CHANNEL_ID = int(os.getenv("DB_CHANNEL_ID"))
@@ -48,6 +72,11 @@ for i, (channel_id, channel_link) in enumerate([
         except ValueError:
             print(f"⚠️ Warning: Invalid FSUB_CHNL_{i}_ID: {channel_id}")
 
+# Force-subscribe membership cache (TTLs in seconds)
+FSUB_CACHE_POSITIVE_TTL = float(os.getenv("FSUB_CACHE_POSITIVE_TTL", "600"))
+FSUB_CACHE_NEGATIVE_TTL = float(os.getenv("FSUB_CACHE_NEGATIVE_TTL", "10"))
+FSUB_CACHE_SIZE = int(os.getenv("FSUB_CACHE_SIZE", "50000"))
+
 # Bot Information
 BOT_USERNAME = os.getenv("BOT_USERNAME", "")
 BOT_NAME = os.getenv("BOT_NAME", "File Share Bot")
@@ -58,11 +87,24 @@ OWNER_ID = int(os.getenv("OWNER_ID", ""))
 # Privacy Mode Configuration
 PRIVACY_MODE = os.getenv("PRIVACY_MODE", "off").lower() == "on"
 
+# Auto-delete time for new uploads (minutes). This, PRIVACY_MODE, BROADCAST_RATE
+# and DELETION_RATE are only defaults: /settings changes them at runtime
+DEFAULT_AUTO_DELETE = int(os.getenv("DEFAULT_AUTO_DELETE", "30"))
+
 # Your Modiji Url Api Key Here
 MODIJI_API_KEY = os.getenv("MODIJI_API_KEY")
 if not MODIJI_API_KEY:
     print("⚠️ Warning: MODIJI_API_KEY not set in environment variables")
 
+# URL shortener: API endpoint (point it at scripts/stub_shortener.py to test
+# locally), seconds per attempt, retries, concurrent requests and result cache
+SHORTENER_API_URL = os.getenv("SHORTENER_API_URL", "https://api.modijiurl.com/api")
+SHORTENER_TIMEOUT = float(os.getenv("SHORTENER_TIMEOUT", "10"))
+SHORTENER_RETRIES = int(os.getenv("SHORTENER_RETRIES", "2"))
+SHORTENER_CONCURRENCY = int(os.getenv("SHORTENER_CONCURRENCY", "5"))
+SHORTENER_CACHE_SIZE = int(os.getenv("SHORTENER_CACHE_SIZE", "10000"))
+SHORTENER_CACHE_TTL = int(os.getenv("SHORTENER_CACHE_TTL", "86400"))  # seconds
+
 # Links
 CHANNEL_LINK = os.getenv("CHANNEL_LINK", "https://t.me/Thealphabotz")
 DEVELOPER_LINK = os.getenv("DEVELOPER_LINK", f"https://t.me/{OWNER_USERNAME}")
@@ -70,6 +112,8 @@ SUPPORT_LINK = os.getenv("SUPPORT_LINK", "https://t.me/utkarsh212646")
 
 # For Koyeb/render 
 WEB_SERVER = bool(os.getenv("WEB_SERVER", True))
+# Seconds /healthz waits for a Mongo ping
+HEALTHZ_TIMEOUT = float(os.getenv("HEALTHZ_TIMEOUT", "2"))
 PING_URL = os.getenv("PING_URL", "")
 PING_TIME = int(os.getenv("PING_TIME", "300"))
 
@@ -87,10 +131,89 @@ if OWNER_ID and OWNER_ID not in ADMIN_IDS:
 # File size limit (2GB in bytes)
 MAX_FILE_SIZE = 2000 * 1024 * 1024
 
+# Broadcast engine: concurrent senders, messages per second, users per
+# checkpoint, seconds between progress edits and FloodWait retries per user
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "10"))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_CHUNK_SIZE = int(os.getenv("BROADCAST_CHUNK_SIZE", "200"))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "10"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+# A running broadcast whose owner hasn't reported progress for this long is
+# taken over by another process; replicas also check for such jobs this often
+BROADCAST_LEASE_TIMEOUT = float(os.getenv("BROADCAST_LEASE_TIMEOUT", "300"))  # seconds
+# Users who blocked the bot or deleted their account are archived after this many days
+USER_PRUNE_AFTER_DAYS = int(os.getenv("USER_PRUNE_AFTER_DAYS", "30"))
+USER_PRUNE_INTERVAL = int(os.getenv("USER_PRUNE_INTERVAL", "86400"))  # seconds
+
+# File delivery: "cached" re-sends the stored file_id, "copy" always copies
+# the message from DB_CHANNEL_ID
+DELIVERY_MODE = os.getenv("DELIVERY_MODE", "cached").lower()
+
+# Batch delivery: files per copy request and how long an interrupted batch
+# can be resumed
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "10"))
+BATCH_RESUME_TTL = int(os.getenv("BATCH_RESUME_TTL", "86400"))  # seconds
+
+# Event loop monitor: seconds between lag samples, lag that counts as a stall
+# (the blocking stack is printed) and LOOP_DEBUG=on to report blocking calls
+# made from coroutines
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.25"))
+LOOP_DEBUG = os.getenv("LOOP_DEBUG", "off").lower() == "on"
+
+# Logging: level, JSON lines (LOG_JSON=off for plain text), the duration above
+# which an update is logged with its full timing breakdown and the fraction of
+# other updates that are logged
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_JSON = os.getenv("LOG_JSON", "on").lower() == "on"
+SLOW_UPDATE_MS = float(os.getenv("SLOW_UPDATE_MS", "1000"))
+UPDATE_LOG_SAMPLE_RATE = float(os.getenv("UPDATE_LOG_SAMPLE_RATE", "0"))
+
+# Outbound Telegram requests: messages per second for the whole bot and per
+# chat (with burst), FloodWait retries and the longest FloodWait worth waiting out
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+OUTBOUND_MAX_FLOOD_WAIT = float(os.getenv("OUTBOUND_MAX_FLOOD_WAIT", "60"))
+# Share of contended global tokens per lane, as lane:weight pairs
+OUTBOUND_LANE_WEIGHTS = os.getenv(
+    "OUTBOUND_LANE_WEIGHTS", "interactive:100,admin:50,batch:10,broadcast:5,deletion:5"
+)
+
+# Abuse shedding on /start and download callbacks: requests per user and per
+# file within a sliding window (seconds). RATE_LIMIT_SHARED=on also counts
+# them in Mongo so the limits hold across replicas
+USER_RATE_LIMIT = int(os.getenv("USER_RATE_LIMIT", "10"))
+USER_RATE_WINDOW = float(os.getenv("USER_RATE_WINDOW", "60"))
+FILE_RATE_LIMIT = int(os.getenv("FILE_RATE_LIMIT", "600"))
+FILE_RATE_WINDOW = float(os.getenv("FILE_RATE_WINDOW", "60"))
+RATE_LIMIT_SHARED = os.getenv("RATE_LIMIT_SHARED", "off").lower() == "on"
+# Seconds after a delivery during which the same link from the same user is ignored
+DELIVERY_DEDUPE_WINDOW = float(os.getenv("DELIVERY_DEDUPE_WINDOW", "5"))
+# Length of the base62 codes in new file and batch links, and how many fresh
+# codes to try when one is already taken
+SHARE_CODE_LENGTH = int(os.getenv("SHARE_CODE_LENGTH", "8"))
+SHARE_CODE_MAX_RETRIES = int(os.getenv("SHARE_CODE_MAX_RETRIES", "5"))
+
 # Time settings
 CURRENT_UTC = "2025-03-24 10:18:35"  # Current UTC time
 AUTO_DELETE_TIME = int(os.getenv("AUTO_DELETE_TIME", "3600"))  # Default 1 hour
 BATCH_SESSION_TIMEOUT = 1800  # 30 minutes
+# Auto-delete scheduler: how far ahead to load due deletions, how many at a time,
+# and after how long a claim by a crashed process may be taken over
+DELETION_WINDOW = float(os.getenv("DELETION_WINDOW", "60"))  # seconds
+DELETION_LOAD_LIMIT = int(os.getenv("DELETION_LOAD_LIMIT", "1000"))
+DELETION_CLAIM_TIMEOUT = float(os.getenv("DELETION_CLAIM_TIMEOUT", "300"))  # seconds
+# Deletion executor: Telegram calls per second, FloodWait retries and chats in flight
+DELETION_RATE = float(os.getenv("DELETION_RATE", "20"))
+DELETION_MAX_RETRIES = int(os.getenv("DELETION_MAX_RETRIES", "3"))
+DELETION_CONCURRENCY = int(os.getenv("DELETION_CONCURRENCY", "10"))
+# A chat whose deletion failed is retried DELETION_RETRY_DELAY seconds later,
+# doubling each time, until DELETION_MAX_ATTEMPTS attempts have been made
+DELETION_RETRY_DELAY = float(os.getenv("DELETION_RETRY_DELAY", "60"))
+DELETION_MAX_ATTEMPTS = int(os.getenv("DELETION_MAX_ATTEMPTS", "5"))
+STATS_RECONCILE_INTERVAL = int(os.getenv("STATS_RECONCILE_INTERVAL", "21600"))  # 6 hours
 
 # Supported file types and extensions
 SUPPORTED_TYPES = [
@@ -1,39 +1,284 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from datetime import datetime
+import bson
+from pymongo import ASCENDING, DESCENDING, DeleteOne, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import time
 import config
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+from utils.cache import TTLCache
+from utils.metrics import instrument
+from utils.share_code import generate_code, is_legacy_uuid
+from utils.write_buffer import (
+    REACHABLE_USER,
+    UNREACHABLE_FIELDS,
+    DeliveryBuffer,
+    UserActivityBuffer,
+    delivery_record,
+)
+
+logger = logging.getLogger(__name__)
+
+
+INDEXES = {
+    "files": [
+        IndexModel([("uuid", ASCENDING)], unique=True, name="uuid_unique"),
+        # Files uploaded before share codes have none until backfilled
+        IndexModel(
+            [("code", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"code": {"$exists": True}},
+            name="code_unique",
+        ),
+    ],
+    "users": [
+        IndexModel([("user_id", ASCENDING)], unique=True, name="user_id_unique"),
+        # Broadcasts walk reachable users in user_id order
+        IndexModel([("reachable", ASCENDING), ("user_id", ASCENDING)], name="reachable_user_id"),
+    ],
+    "deliveries": [
+        IndexModel(
+            [("uuid", ASCENDING), ("chat_id", ASCENDING), ("message_id", ASCENDING)],
+            unique=True,
+            name="uuid_chat_message_unique",
+        ),
+        # Records are dropped by the server once delete_at + grace has passed
+        IndexModel(
+            [("delete_at", ASCENDING)],
+            expireAfterSeconds=config.DELIVERY_RECORD_GRACE,
+            name="delete_at_ttl",
+        ),
+    ],
+    "deletion_queue": [
+        IndexModel([("due_at", ASCENDING)], name="due_at"),
+    ],
+    "invalidations": [
+        IndexModel([("at", ASCENDING)], expireAfterSeconds=3600, name="at_ttl"),
+    ],
+    "rate_limits": [
+        IndexModel([("expire_at", ASCENDING)], expireAfterSeconds=0, name="expire_at_ttl"),
+    ],
+    "batch_progress": [
+        IndexModel([("user_id", ASCENDING), ("batch_id", ASCENDING)], unique=True, name="user_batch_unique"),
+        IndexModel([("updated_at", ASCENDING)], expireAfterSeconds=config.BATCH_RESUME_TTL, name="updated_at_ttl"),
+    ],
+    "batches": [
+        IndexModel([("batch_id", ASCENDING)], unique=True, name="batch_id_unique"),
+        IndexModel(
+            [("admin_id", ASCENDING), ("is_active", ASCENDING), ("created_at", DESCENDING)],
+            name="admin_active_created",
+        ),
+    ],
+}
+
+# Fields a handler needs from a file document; everything else stays on the server
+FILE_PROJECTION = {
+    "uuid": True,
+    "code": True,
+    "file_id": True,
+    "file_name": True,
+    "file_size": True,
+    "file_type": True,
+    "message_id": True,
+    "caption": True,
+    "uploader_id": True,
+    "downloads": True,
+    "auto_delete": True,
+    "auto_delete_time": True,
+    "uploaded_at": True,
+}
+
+# Single document in the stats collection holding the /stats counters
+STATS_ID = "files"
+STATS_FIELDS = ("total_files", "total_size", "total_downloads", "autodelete_files")
+
+# Marks a metadata cache miss, as opposed to a cached "not found" (None)
+_MISSING = object()
+
+# Longer than any metadata lookup can take (seconds)
+_LOOKUP_TIMEOUT = 60
+
+
+def _doc_size(doc: Optional[Dict[str, Any]]) -> int:
+    # Negative entries still cost their key and bookkeeping
+    return len(bson.encode(doc)) if doc else 64
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    """Flatten every ``stage`` name found in an explain() plan tree."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
 
 
 class Database:
+    """Process-wide database handle.
+
+    Created once by ``FileShareBot.start()`` and shared with every handler
+    through ``client.db`` so the whole bot runs on a single connection pool.
+    """
+
     def __init__(self):
-        self.client = AsyncIOMotorClient(config.MONGO_URI)
+        self.client = AsyncIOMotorClient(
+            config.MONGO_URI,
+            maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+            minPoolSize=config.MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=config.MONGO_MAX_IDLE_TIME_MS,
+        )
         self.db = self.client[config.DATABASE_NAME]
         self.files = self.db.files
         self.users = self.db.users
         self.batches = self.db.batches
+        self.stats = self.db.stats
+        self.deliveries = self.db.deliveries
+        self.deletion_queue = self.db.deletion_queue
+        self.broadcasts = self.db.broadcasts
+        self.batch_progress = self.db.batch_progress
+        self.settings = self.db.settings
+        self.short_urls = self.db.short_urls
+        self.rate_limits = self.db.rate_limits
+        self.invalidations = self.db.invalidations
+        self.metadata_cache = TTLCache(
+            config.METADATA_CACHE_SIZE,
+            max_bytes=config.METADATA_CACHE_BYTES,
+            sizeof=_doc_size,
+        )
+        self._cached_ids = TTLCache(config.METADATA_CACHE_SIZE)
+        # uuid <-> code of cached files whose code differs from their uuid, so
+        # invalidating either key drops both entries
+        self._file_aliases = TTLCache(config.METADATA_CACHE_SIZE)
+        # Bumped by every invalidation. A lookup that was in flight when its key
+        # (or the whole cache) was dropped may have read the old document, so
+        # its result isn't cached: _dropped_at holds the epoch of the last drop
+        # of each key that has lookups in flight (counted in _lookups), and
+        # _dropped_ids that of documents changed while any lookup was in flight
+        self._cache_epoch = 0
+        self._cleared_at = 0
+        self._lookups: Dict[Tuple[str, str], int] = {}
+        self._dropped_at: Dict[Tuple[str, str], int] = {}
+        self._dropped_ids = TTLCache(config.METADATA_CACHE_SIZE)
+        # Set by CacheInvalidator when change streams are unavailable
+        self.log_invalidations = False
+        self.user_activity = UserActivityBuffer(
+            self.users,
+            interval=config.USER_FLUSH_INTERVAL,
+            max_size=config.USER_FLUSH_SIZE,
+            dedupe_window=config.USER_DEDUPE_WINDOW,
+        )
+        self.delivery_buffer = DeliveryBuffer(
+            self.files,
+            self.deliveries,
+            self.stats,
+            STATS_ID,
+            interval=config.DELIVERY_FLUSH_INTERVAL,
+            max_size=config.DELIVERY_FLUSH_SIZE,
+        )
+
+    async def connect(self) -> None:
+        # Round trip once so the pool is warm before the first update arrives
+        await self.client.admin.command("ping")
+        await self.ensure_indexes()
+        await self.seed_stats()
+        self.user_activity.start()
+        self.delivery_buffer.start()
         print("Database Connected Successfully!")
 
-    async def add_batch(self, batch_data: dict):
+    async def ensure_indexes(self) -> None:
+        # create_indexes is a no-op for indexes that already exist
+        for collection, indexes in INDEXES.items():
+            try:
+                await self.db[collection].create_indexes(indexes)
+            except OperationFailure as e:
+                logger.error(f"Database Error (ensure_indexes {collection}): {str(e)}")
+        # Users stored before reachability was tracked count as reachable
+        await self.users.update_many({"reachable": {"$exists": False}}, {"$set": {"reachable": True}})
+
+    async def explain_hot_queries(self) -> Dict[str, List[str]]:
+        """Return the winning plan stages of every query on a hot path."""
+        cursors = {
+            "get_file": self.files.find({"uuid": ""}).limit(1),
+            "get_file_by_code": self.files.find({"code": ""}).limit(1),
+            "get_batch": self.batches.find({"batch_id": "", "is_active": True}).limit(1),
+            "add_user": self.users.find({"user_id": 0}).limit(1),
+            "list_admin_batches": self.batches.find(
+                {"admin_id": 0, "is_active": True}
+            ).sort("created_at", -1),
+            "iter_users": self.iter_users(0),
+            "get_file_messages": self.deliveries.find({"uuid": ""}),
+            "get_due_deletions": self.deletion_queue.find(
+                {
+                    "due_at": {"$lte": datetime.utcnow()},
+                    "$or": [{"claimed_at": None}, {"claimed_at": {"$lt": datetime.utcnow()}}],
+                }
+            ).sort("due_at", 1).limit(1),
+        }
+        plans = {}
+        for name, cursor in cursors.items():
+            explain = await cursor.explain()
+            plans[name] = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        return plans
+
+    async def close(self) -> None:
+        await self.user_activity.stop()
+        await self.delivery_buffer.stop()
+        self.client.close()
+        print("Database Connection Closed!")
+
+    async def add_batch(self, batch_data: dict) -> str:
+        """Insert a batch under a fresh share code and return its batch_id."""
         try:
-            return await self.batches.insert_one(batch_data)
+            await self._insert_with_code(
+                self.batches, batch_data, lambda doc, code: doc.update(batch_id=code)
+            )
+            await self.invalidate_batch(batch_data["batch_id"])
+            return batch_data["batch_id"]
         except Exception as e:
             print(f"Database Error (add_batch): {str(e)}")
             raise
 
     async def get_batch(self, batch_id: str):
         try:
-            return await self.batches.find_one({"batch_id": batch_id, "is_active": True})
+            return await self._cached(
+                ("batch", batch_id),
+                lambda: self.batches.find_one({"batch_id": batch_id, "is_active": True}),
+            )
         except Exception as e:
             print(f"Database Error (get_batch): {str(e)}")
             raise
 
     async def delete_batch(self, batch_id: str):
         try:
-            return await self.batches.delete_one({"batch_id": batch_id})
+            result = await self.batches.delete_one({"batch_id": batch_id})
+            await self.invalidate_batch(batch_id)
+            return result
         except Exception as e:
             print(f"Database Error (delete_batch): {str(e)}")
             raise
 
+    async def get_batch_progress(self, user_id: int, batch_id: str) -> int:
+        """Number of files of `batch_id` already delivered to `user_id` by an interrupted download."""
+        progress = await self.batch_progress.find_one({"user_id": user_id, "batch_id": batch_id})
+        return progress["sent"] if progress else 0
+
+    async def set_batch_progress(self, user_id: int, batch_id: str, sent: int) -> None:
+        await self.batch_progress.update_one(
+            {"user_id": user_id, "batch_id": batch_id},
+            {"$set": {"sent": sent, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    async def clear_batch_progress(self, user_id: int, batch_id: str) -> None:
+        await self.batch_progress.delete_one({"user_id": user_id, "batch_id": batch_id})
+
     async def list_admin_batches(self, admin_id: int):
         try:
             cursor = self.batches.find({"admin_id": admin_id, "is_active": True}).sort("created_at", -1)
@@ -48,7 +293,6 @@ class Database:
             "file_name": file_data["file_name"],
             "file_size": file_data["file_size"],
             "file_type": file_data["file_type"],
-            "uuid": file_data["uuid"],
             "uploader_id": file_data["uploader_id"],
             "message_id": file_data["message_id"],
             "downloads": 0,
@@ -56,20 +300,198 @@ class Database:
             "auto_delete_time": file_data.get("auto_delete_time", None),
             "uploaded_at": datetime.utcnow(),
         }
-        await self.files.insert_one(file_doc)
+        if "caption" in file_data:
+            file_doc["caption"] = file_data["caption"]
+        # New files use their share code as uuid too; only legacy files differ
+        await self._insert_with_code(
+            self.files, file_doc, lambda doc, code: doc.update(uuid=code, code=code)
+        )
+        await self.invalidate_file(file_doc["uuid"])
+        await self._inc_stats(
+            total_files=1,
+            total_size=file_doc["file_size"] or 0,
+            autodelete_files=1 if file_doc["auto_delete"] else 0,
+        )
         return file_doc["uuid"]
 
-    async def get_file(self, uuid: str) -> Optional[Dict[str, Any]]:
-        return await self.files.find_one({"uuid": uuid})
+    async def get_file(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look a file up by share code, or by uuid for links made before share codes."""
+        field = "uuid" if is_legacy_uuid(key) else "code"
+        return await self._cached(
+            ("file", key), lambda: self.files.find_one({field: key}, projection=FILE_PROJECTION)
+        )
+
+    async def _insert_with_code(self, collection, doc: Dict[str, Any], assign) -> None:
+        """
+        Insert `doc` after `assign(doc, code)` gives it a new share code,
+        drawing another code whenever the unique index reports a collision.
+        """
+        for attempt in range(config.SHARE_CODE_MAX_RETRIES + 1):
+            assign(doc, generate_code())
+            # insert_one sets _id on the dict; a retry must not reuse it
+            doc.pop("_id", None)
+            try:
+                await collection.insert_one(doc)
+                return
+            except DuplicateKeyError:
+                if attempt == config.SHARE_CODE_MAX_RETRIES:
+                    raise
+                logger.warning(f"Share code collision in {collection.name}, retrying")
+
+    async def backfill_share_codes(self, batch_size: int = 1000) -> int:
+        """Give every file without a share code one; returns the number of files updated."""
+        updated = 0
+        while True:
+            uuids = await self.files.find(
+                {"code": {"$exists": False}}, projection={"_id": False, "uuid": True}
+            ).limit(batch_size).to_list(None)
+            if not uuids:
+                return updated
+            requests = [
+                UpdateOne({"uuid": doc["uuid"], "code": {"$exists": False}}, {"$set": {"code": generate_code()}})
+                for doc in uuids
+            ]
+            try:
+                result = await self.files.bulk_write(requests, ordered=False)
+                updated += result.modified_count
+            except BulkWriteError as e:
+                # Colliding codes are left unset and picked up again next round
+                updated += e.details.get("nModified", 0)
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+            for doc in uuids:
+                self.drop_cached("file", doc["uuid"])
+
+    async def _cached(self, key: Tuple[str, str], lookup) -> Optional[Dict[str, Any]]:
+        """
+        Serve `key` from the metadata cache, awaiting `lookup()` on a miss.
+        Unknown keys are cached too (for a shorter time) to absorb floods
+        of guessed links. Callers must treat the returned dict as read-only.
+        """
+        cached = self.metadata_cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            return cached
+
+        started = self._cache_epoch
+        self._lookups[key] = self._lookups.get(key, 0) + 1
+        try:
+            doc = await lookup()
+            stale = max(self._dropped_at.get(key, 0), self._cleared_at) > started
+            if doc and self._dropped_ids.get(doc["_id"], 0) > started:
+                stale = True
+        finally:
+            self._lookups[key] -= 1
+            if not self._lookups[key]:
+                del self._lookups[key]
+                self._dropped_at.pop(key, None)
+        if stale:
+            return doc
+
+        ttl = config.METADATA_CACHE_TTL if doc else config.METADATA_CACHE_NEGATIVE_TTL
+        self.metadata_cache.set(key, doc, ttl)
+        if doc:
+            # Change stream events for updates and deletes only carry the _id
+            self._cached_ids.set(doc["_id"], key, ttl)
+            if key[0] == "file" and doc.get("code", doc["uuid"]) != doc["uuid"]:
+                self._file_aliases.set(doc["uuid"], doc["code"], ttl)
+                self._file_aliases.set(doc["code"], doc["uuid"], ttl)
+        return doc
+
+    async def invalidate_file(self, uuid: str) -> None:
+        await self._invalidate("file", uuid)
+
+    async def invalidate_batch(self, batch_id: str) -> None:
+        await self._invalidate("batch", batch_id)
+
+    async def _invalidate(self, kind: str, key: str) -> None:
+        """Drop a cached entry here and, without change streams, tell the other replicas."""
+        self.drop_cached(kind, key)
+        if self.log_invalidations:
+            await self.invalidations.insert_one({"kind": kind, "key": key, "at": datetime.utcnow()})
+
+    def drop_cached(self, kind: str, key: Any) -> None:
+        self._drop_key((kind, key))
+        if kind == "file":
+            alias = self._file_aliases.get(key)
+            if alias:
+                self._drop_key((kind, alias))
+
+    def clear_cached(self) -> None:
+        self._cache_epoch += 1
+        self._cleared_at = self._cache_epoch
+        self.metadata_cache.clear()
+
+    def _drop_key(self, key: Tuple[str, str]) -> None:
+        self._cache_epoch += 1
+        self.metadata_cache.invalidate(key)
+        if key in self._lookups:
+            self._dropped_at[key] = self._cache_epoch
+
+    def drop_cached_id(self, object_id: Any) -> None:
+        key = self._cached_ids.get(object_id)
+        if key:
+            self._cached_ids.invalidate(object_id)
+            self.drop_cached(*key)
+        if self._lookups:
+            # A lookup in flight may be reading the document under a key not cached yet
+            self._cache_epoch += 1
+            self._dropped_ids.set(object_id, self._cache_epoch, _LOOKUP_TIMEOUT)
+
+    async def get_invalidations(self, since: datetime) -> List[Dict[str, Any]]:
+        return await self.invalidations.find({"at": {"$gte": since}}).to_list(None)
+
+    async def get_settings(self) -> List[Dict[str, Any]]:
+        return await self.settings.find({}).to_list(None)
+
+    async def set_setting(self, name: str, value: Any) -> int:
+        """Store a setting and return its new version."""
+        setting = await self.settings.find_one_and_update(
+            {"_id": name},
+            {"$set": {"value": value, "updated_at": datetime.utcnow()}, "$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        await self._invalidate("setting", name)
+        return setting["version"]
+
+    async def count_request(self, key: str, window: float) -> float:
+        """Count a request for `key` and return its sliding-window count across all replicas."""
+        now = time.time()
+        index = int(now // window)
+        current = await self.rate_limits.find_one_and_update(
+            {"_id": f"{key}:{index}"},
+            {"$inc": {"count": 1}, "$setOnInsert": {"expire_at": datetime.utcfromtimestamp((index + 2) * window)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        previous = await self.rate_limits.find_one({"_id": f"{key}:{index - 1}"})
+        overlap = 1 - (now % window) / window
+        return current["count"] + (previous["count"] * overlap if previous else 0)
+
+    async def get_short_url(self, provider: str, url: str) -> Optional[str]:
+        short_url = await self.short_urls.find_one({"_id": f"{provider}:{url}"}, {"short_url": 1})
+        return short_url["short_url"] if short_url else None
+
+    async def save_short_url(self, provider: str, url: str, short_url: str) -> None:
+        await self.short_urls.update_one(
+            {"_id": f"{provider}:{url}"},
+            {"$set": {"short_url": short_url, "created_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    async def update_file_id(self, uuid: str, file_id: str) -> None:
+        await self.files.update_one({"uuid": uuid}, {"$set": {"file_id": file_id}})
+        await self.invalidate_file(uuid)
 
     async def increment_downloads(self, uuid: str) -> None:
         await self.files.update_one(
             {"uuid": uuid},
             {"$inc": {"downloads": 1}, "$set": {"last_download": datetime.utcnow()}},
         )
+        await self._inc_stats(total_downloads=1)
 
     async def set_file_autodelete(self, uuid: str, delete_time: int) -> bool:
-        result = await self.files.update_one(
+        previous = await self.files.find_one_and_update(
             {"uuid": uuid},
             {
                 "$set": {
@@ -78,76 +500,350 @@ class Database:
                     "delete_at": datetime.utcnow(),
                 }
             },
+            projection={"auto_delete": True},
         )
-        return result.modified_count > 0
+        await self.invalidate_file(uuid)
+        if previous and not previous.get("auto_delete"):
+            await self._inc_stats(autodelete_files=1)
+        return previous is not None
 
     async def get_autodelete_files(self) -> List[Dict[str, Any]]:
         return await self.files.find({"auto_delete": True}).to_list(None)
 
-    async def update_file_message_id(self, uuid: str, message_id: int, chat_id: int) -> None:
+    async def update_file_message_id(self, uuid: str, message_id: int, chat_id: int, delete_after: int = None) -> None:
+        await self.deliveries.update_one(
+            {"uuid": uuid, "chat_id": chat_id, "message_id": message_id},
+            {"$setOnInsert": delivery_record(datetime.utcnow(), delete_after)},
+            upsert=True,
+        )
+
+    async def record_delivery(
+        self, uuid: str, chat_id: int, message_id: int, delete_after: int = None, immediate: bool = False
+    ) -> None:
+        """
+        Count a download of `uuid` and remember the delivered message in the
+        deliveries collection with delete_at set `delete_after` minutes from now.
+        Buffered by default; with `immediate` both writes go out right away.
+        """
+        if not immediate:
+            self.delivery_buffer.add(uuid, chat_id, message_id, delete_after)
+            return
+
         await self.files.update_one(
             {"uuid": uuid},
-            {
-                "$push": {
-                    "active_messages": {
-                        "chat_id": chat_id,
-                        "message_id": message_id,
-                        "sent_at": datetime.utcnow(),
-                    }
-                }
-            },
+            {"$inc": {"downloads": 1}, "$set": {"last_download": datetime.utcnow()}},
         )
+        await self.update_file_message_id(uuid, message_id, chat_id, delete_after)
+        await self._inc_stats(total_downloads=1)
 
     async def remove_file_message(self, uuid: str, chat_id: int, message_id: int) -> None:
-        await self.files.update_one(
-            {"uuid": uuid}, {"$pull": {"active_messages": {"chat_id": chat_id, "message_id": message_id}}}
+        await self.deliveries.delete_one({"uuid": uuid, "chat_id": chat_id, "message_id": message_id})
+
+    async def remove_file_messages(self, messages: List[Tuple[str, int, int]]) -> None:
+        """Bulk version of remove_file_message for (uuid, chat_id, message_id) tuples."""
+        if not messages:
+            return
+        ops = [
+            DeleteOne({"uuid": uuid, "chat_id": chat_id, "message_id": message_id})
+            for uuid, chat_id, message_id in messages
+        ]
+        await self.deliveries.bulk_write(ops, ordered=False)
+
+    async def migrate_active_messages(self, batch_size: int = 500) -> Tuple[int, int]:
+        """
+        Move the active_messages arrays older releases kept on file documents
+        into the deliveries collection and unset them. Entries the TTL index
+        would already have dropped are discarded. Returns (files, messages moved).
+        """
+        files = moved = 0
+        expired_before = datetime.utcnow() - timedelta(seconds=config.DELIVERY_RECORD_GRACE)
+        while True:
+            docs = await self.files.find(
+                {"active_messages": {"$exists": True}},
+                projection={"uuid": True, "active_messages": True, "auto_delete": True, "auto_delete_time": True},
+            ).limit(batch_size).to_list(None)
+            if not docs:
+                return files, moved
+
+            records = []
+            for doc in docs:
+                delete_after = doc.get("auto_delete_time") if doc.get("auto_delete") else None
+                for message in doc.get("active_messages") or []:
+                    record = delivery_record(message.get("sent_at") or datetime.utcnow(), delete_after)
+                    if record["delete_at"] < expired_before:
+                        continue
+                    records.append(UpdateOne(
+                        {"uuid": doc["uuid"], "chat_id": message["chat_id"], "message_id": message["message_id"]},
+                        {"$setOnInsert": record},
+                        upsert=True,
+                    ))
+            # Copy before unsetting, so an interrupted run loses nothing and can be re-run
+            if records:
+                try:
+                    await self.deliveries.bulk_write(records, ordered=False)
+                except BulkWriteError as e:
+                    # Concurrent upserts of the same record; it exists either way
+                    if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                        raise
+            await self.files.bulk_write(
+                [UpdateOne({"_id": doc["_id"]}, {"$unset": {"active_messages": ""}}) for doc in docs],
+                ordered=False,
+            )
+            files += len(docs)
+            moved += len(records)
+
+    async def enqueue_deletion(self, uuid: str, chat_id: int, message_ids: List[int], due_at: datetime) -> Dict[str, Any]:
+        entry = {
+            "uuid": uuid,
+            "chat_id": chat_id,
+            "message_ids": message_ids,
+            "due_at": due_at,
+            "claimed_by": None,
+            "claimed_at": None,
+        }
+        await self.deletion_queue.insert_one(entry)
+        return entry
+
+    async def get_due_deletions(self, horizon: datetime, stale_claim: datetime, limit: int) -> List[Dict[str, Any]]:
+        """Queued deletions due before `horizon` that nobody holds a live claim on."""
+        cursor = self.deletion_queue.find(
+            {
+                "due_at": {"$lte": horizon},
+                "$or": [{"claimed_at": None}, {"claimed_at": {"$lt": stale_claim}}],
+            }
+        ).sort("due_at", 1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def claim_deletions(self, entry_ids: List[Any], owner: str, stale_claim: datetime) -> List[Any]:
+        """Claim queued deletions for `owner` and return the ids it now holds."""
+        await self.deletion_queue.update_many(
+            {
+                "_id": {"$in": entry_ids},
+                "$or": [{"claimed_at": None}, {"claimed_at": {"$lt": stale_claim}}],
+            },
+            {"$set": {"claimed_by": owner, "claimed_at": datetime.utcnow()}},
         )
+        cursor = self.deletion_queue.find(
+            {"_id": {"$in": entry_ids}, "claimed_by": owner}, projection={"_id": True}
+        )
+        return [entry["_id"] for entry in await cursor.to_list(None)]
 
-    async def get_stats(self) -> Dict[str, Any]:
-        total_files = await self.files.count_documents({})
-        total_users = await self.users.count_documents({})
-        total_size = 0
-        total_downloads = 0
+    async def release_deletions(self, entries: List[Dict[str, Any]], owner: str) -> None:
+        """Give up `owner`'s claim on failed deletions, storing their new due_at and attempt count."""
+        ops = [
+            UpdateOne(
+                {"_id": entry["_id"], "claimed_by": owner},
+                {"$set": {
+                    "due_at": entry["due_at"],
+                    "attempts": entry["attempts"],
+                    "claimed_by": None,
+                    "claimed_at": None,
+                }},
+            )
+            for entry in entries
+        ]
+        await self.deletion_queue.bulk_write(ops, ordered=False)
 
-        async for file in self.files.find({}):
-            total_size += file.get("file_size", 0)
-            total_downloads += file.get("downloads", 0)
+    async def remove_deletions(self, entry_ids: List[Any]) -> None:
+        await self.deletion_queue.delete_many({"_id": {"$in": entry_ids}})
+
+    async def count_pending_deletions(self) -> int:
+        return await self.deletion_queue.estimated_document_count()
+
+    async def get_stats(self) -> Dict[str, Any]:
+        counters = await self.stats.find_one({"_id": STATS_ID})
+        if not counters or "reconciled_at" not in counters:
+            counters = await self.reconcile_stats()
 
         return {
-            "total_files": total_files,
-            "total_users": total_users,
-            "total_size": total_size,
-            "total_downloads": total_downloads,
-            "active_autodelete_files": await self.files.count_documents({"auto_delete": True}),
+            "total_files": counters.get("total_files", 0),
+            "total_users": await self.users.estimated_document_count(),
+            "unreachable_users": await self.count_unreachable_users(),
+            "total_size": counters.get("total_size", 0),
+            "total_downloads": counters.get("total_downloads", 0),
+            "active_autodelete_files": counters.get("autodelete_files", 0),
         }
 
+    async def reconcile_stats(self) -> Dict[str, Any]:
+        """Recompute the stats counters from the files collection on the server."""
+        pipeline = [
+            {
+                "$group": {
+                    "_id": None,
+                    "total_files": {"$sum": 1},
+                    "total_size": {"$sum": {"$ifNull": ["$file_size", 0]}},
+                    "total_downloads": {"$sum": {"$ifNull": ["$downloads", 0]}},
+                    "autodelete_files": {"$sum": {"$cond": [{"$eq": ["$auto_delete", True]}, 1, 0]}},
+                }
+            }
+        ]
+        result = await self.files.aggregate(pipeline).to_list(1)
+        totals = result[0] if result else {}
+        counters = {field: totals.get(field, 0) for field in STATS_FIELDS}
+        await self.stats.update_one(
+            {"_id": STATS_ID},
+            {"$set": {**counters, "reconciled_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        return counters
+
+    async def seed_stats(self) -> None:
+        """
+        Count the existing files once on a deployment that has never been
+        reconciled. Until then the counters document, if any, only holds the
+        increments made since it was upserted.
+        """
+        if not await self.stats.find_one({"_id": STATS_ID, "reconciled_at": {"$exists": True}}):
+            try:
+                await self.reconcile_stats()
+            except Exception as e:
+                logger.error(f"Database Error (seed_stats): {str(e)}")
+
+    async def reconcile_stats_periodically(self, interval: int) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reconcile_stats()
+            except Exception as e:
+                logger.error(f"Database Error (reconcile_stats): {str(e)}")
+
+    async def _inc_stats(self, **deltas) -> None:
+        await self.stats.update_one({"_id": STATS_ID}, {"$inc": deltas}, upsert=True)
+
     async def add_user(self, user_id: int, username: str = None) -> None:
         await self.users.update_one(
             {"user_id": user_id},
             {
-                "$set": {
-                    "username": username,
-                    "joined_date": datetime.utcnow(),
-                    "last_active": datetime.utcnow(),
-                }
+                "$set": {"username": username, "last_active": datetime.utcnow(), **REACHABLE_USER},
+                "$unset": UNREACHABLE_FIELDS,
+                "$setOnInsert": {"joined_date": datetime.utcnow()},
             },
             upsert=True,
         )
 
+    def track_user(self, user_id: int, username: str = None) -> None:
+        """Record user activity without waiting for the write; see UserActivityBuffer."""
+        self.user_activity.add(user_id, username)
+
     async def get_all_users(self) -> List[Dict[str, Any]]:
         return await self.users.find({}).to_list(None)
 
+    def iter_users(self, after_user_id: int = None, batch_size: int = 500):
+        """Cursor over reachable user ids in ascending order, starting after `after_user_id`."""
+        query = {"reachable": True}
+        if after_user_id is not None:
+            query["user_id"] = {"$gt": after_user_id}
+        return self.users.find(query, projection={"_id": False, "user_id": True}).sort(
+            "user_id", ASCENDING
+        ).batch_size(batch_size)
+
+    async def mark_unreachable_users(self, outcomes: Dict[int, str]) -> None:
+        """Record why each user in `outcomes` ({user_id: reason}) can no longer be messaged."""
+        if not outcomes:
+            return
+        now = datetime.utcnow()
+        ops = []
+        for user_id, reason in outcomes.items():
+            fields = {"reachable": False, "unreachable_at": now, "unreachable_reason": reason}
+            if reason == "blocked":
+                fields["blocked_at"] = now
+            elif reason == "deactivated":
+                fields["deactivated"] = True
+            ops.append(UpdateOne({"user_id": user_id}, {"$set": fields}))
+        await self.users.bulk_write(ops, ordered=False)
+
+    async def count_reachable_users(self) -> int:
+        return await self.users.count_documents({"reachable": True})
+
+    async def count_unreachable_users(self) -> int:
+        return await self.users.count_documents({"reachable": False})
+
+    async def prune_unreachable_users(self, older_than_days: int) -> int:
+        """Move users unreachable for longer than `older_than_days` into users_archive."""
+        query = {
+            "reachable": False,
+            "unreachable_at": {"$lt": datetime.utcnow() - timedelta(days=older_than_days)},
+        }
+        await self.users.aggregate([
+            {"$match": query},
+            {"$merge": {"into": "users_archive", "on": "_id", "whenMatched": "replace"}},
+        ]).to_list(None)
+        result = await self.users.delete_many(query)
+        return result.deleted_count
+
+    async def prune_unreachable_users_periodically(self, interval: int, older_than_days: int) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                pruned = await self.prune_unreachable_users(older_than_days)
+                if pruned:
+                    logger.info(f"Archived {pruned} unreachable users")
+            except Exception as e:
+                logger.error(f"Database Error (prune_unreachable_users): {str(e)}")
+
+    async def create_broadcast(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        await self.broadcasts.insert_one(job)
+        return job
+
+    async def update_broadcast(self, job_id: Any, fields: Dict[str, Any], owner: str = None) -> bool:
+        """
+        Update a broadcast job. With `owner` the update only applies while that
+        process still holds the job and renews its heartbeat; returns whether it applied.
+        """
+        query = {"_id": job_id}
+        fields = {**fields, "updated_at": datetime.utcnow()}
+        if owner is not None:
+            query["owner"] = owner
+            fields["heartbeat"] = fields["updated_at"]
+        result = await self.broadcasts.update_one(query, {"$set": fields})
+        return result.matched_count == 1
+
+    async def claim_broadcast(self, job_id: Any, owner: str, stale_heartbeat: datetime) -> Optional[Dict[str, Any]]:
+        """Take over a running broadcast nobody holds a live lease on; returns the job if claimed."""
+        return await self.broadcasts.find_one_and_update(
+            {
+                "_id": job_id,
+                "status": "running",
+                "$or": [{"owner": None}, {"heartbeat": {"$lt": stale_heartbeat}}],
+            },
+            {"$set": {"owner": owner, "heartbeat": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def get_running_broadcasts(self) -> List[Dict[str, Any]]:
+        return await self.broadcasts.find({"status": "running"}).to_list(None)
+
     async def get_file_messages(self, uuid: str) -> List[Dict[str, Any]]:
-        file = await self.get_file(uuid)
-        return file.get("active_messages", []) if file else []
+        cursor = self.deliveries.find(
+            {"uuid": uuid}, projection={"_id": False, "chat_id": True, "message_id": True, "sent_at": True}
+        )
+        return await cursor.to_list(None)
 
     async def check_autodelete_status(self, uuid: str) -> Optional[Dict[str, Any]]:
-        file = await self.get_file(uuid)
+        file = await self.files.find_one(
+            {"uuid": uuid}, projection={"auto_delete": True, "auto_delete_time": True, "delete_at": True}
+        )
         if file and file.get("auto_delete"):
             delete_time = file.get("auto_delete_time", 0)
             sent_time = file.get("delete_at")
             if sent_time:
                 time_diff = (datetime.utcnow() - sent_time).total_seconds() / 60
                 if time_diff >= delete_time:
-                    return {"should_delete": True, "messages": file.get("active_messages", [])}
+                    return {"should_delete": True, "messages": await self.get_file_messages(uuid)}
         return None
+
+
+# Background loops and lifecycle calls would only skew the per-method latencies
+instrument(
+    Database,
+    "mongo_duration_seconds",
+    skip=(
+        "connect",
+        "close",
+        "reconcile_stats_periodically",
+        "prune_unreachable_users_periodically",
+        "backfill_share_codes",
+        "migrate_active_messages",
+    ),
+    span="mongo",
+)
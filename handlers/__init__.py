@@ -1,5 +1,6 @@
 from .admin.auto_delete import auto_delete_command
 from .admin.broadcast import broadcast_command
+from .admin.settings import settings_command
 from .admin.stats import stats_command
 from .admin.upload import upload_command
 from .shortner import short_url_command
@@ -10,6 +11,7 @@ from .user.about import about_command
 __all__ = [
     'auto_delete_command',
     'broadcast_command',
+    'settings_command',
     'stats_command',
     'upload_command',
     'short_url_command',
@@ -1,7 +1,6 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message
 from utils import is_admin
-import config
 
 @Client.on_message(filters.command("auto_del"))
 async def auto_delete_command(client: Client, message: Message):
@@ -34,7 +33,7 @@ async def auto_delete_command(client: Client, message: Message):
             )
             return
         
-        config.DEFAULT_AUTO_DELETE = delete_time
+        await client.settings.set("auto_delete_time", delete_time)
         await message.reply_text(
             f"✅ **Auto-delete time updated**\n\n"
             f"New files will be automatically deleted after {delete_time} minutes\n"
@@ -1,9 +1,8 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup
-from uuid import uuid4
+from functools import wraps
 import time
 from datetime import datetime
-from database import Database
 from config import Messages, ADMIN_IDS, DB_CHANNEL_ID
 from handlers.utils import get_size_formatted
 
@@ -14,12 +13,14 @@ class BatchUploadSession:
     def __init__(self, admin_id: int):
         self.admin_id = admin_id
         self.files = []
-        self.batch_id = str(uuid4())[:8]
+        # Assigned when the batch is stored
+        self.batch_id = None
         self.start_time = time.time()
         self.created_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
 
 def admin_check(func):
     """Decorator to check if user is an admin"""
+    @wraps(func)
     async def wrapper(client: Client, message: Message):
         if message.from_user.id not in ADMIN_IDS:
             await message.reply_text("⚠️ This command is only for admins!")
@@ -75,16 +76,14 @@ async def finish_batch_upload(client: Client, message: Message):
     
     try:
         # Store batch information in database
-        db = Database()
         batch_data = {
-            "batch_id": session.batch_id,
             "admin_id": admin_id,
             "files": session.files,
             "created_at": session.created_at,
             "is_active": True
         }
         
-        await db.add_batch(batch_data)
+        session.batch_id = await client.db.add_batch(batch_data)
         
         # Get bot info
         bot = await client.get_me()
@@ -0,0 +1,39 @@
+from pyrogram import Client, filters
+from pyrogram.types import Message
+from utils import is_admin
+from utils.settings import SETTINGS
+
+
+@Client.on_message(filters.command("settings"))
+async def settings_command(client: Client, message: Message):
+    if not is_admin(message):
+        await message.reply_text("⚠️ You are not authorized to change settings!")
+        return
+
+    if len(message.command) == 1:
+        lines = [
+            f"• `{name}` = `{value}`\n  {SETTINGS[name][2]}"
+            for name, value in client.settings.items()
+        ]
+        await message.reply_text(
+            "⚙️ **Runtime Settings**\n\n" + "\n".join(lines) + "\n\n"
+            "Change one with `/settings <name> <value>`"
+        )
+        return
+
+    if len(message.command) != 3:
+        await message.reply_text("**Usage:** `/settings <name> <value>`")
+        return
+
+    name, value = message.command[1], message.command[2]
+    if name not in SETTINGS:
+        await message.reply_text(f"❌ Unknown setting `{name}`")
+        return
+
+    try:
+        value = await client.settings.set(name, value)
+    except ValueError as e:
+        await message.reply_text(f"❌ **Invalid value for** `{name}`: {str(e)}")
+        return
+
+    await message.reply_text(f"✅ `{name}` set to `{value}`")
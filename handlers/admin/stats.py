@@ -1,10 +1,7 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message
-from database import Database
 from utils import is_admin, humanbytes
-import config
 
-db = Database()
 
 @Client.on_message(filters.command("stats"))
 async def stats_command(client: Client, message: Message):
@@ -12,14 +9,27 @@ async def stats_command(client: Client, message: Message):
         await message.reply_text("⚠️ You are not authorized to view stats!")
         return
     
-    stats = await db.get_stats()
+    stats = await client.db.get_stats()
+    deletions = await client.deletion_scheduler.stats()
+    metadata_cache = client.db.metadata_cache.stats()
+    fsub_cache = client.force_sub.cache.stats()
+    loop_lag = client.loop_monitor.stats()
+    lanes = client.outbound.stats()
     stats_text = (
         "📊 **Bot Statistics**\n\n"
         f"📁 Files: {stats['total_files']}\n"
-        f"👥 Users: {stats['total_users']}\n"
+        f"👥 Users: {stats['total_users']} ({stats['unreachable_users']} unreachable)\n"
         f"📥 Downloads: {stats['total_downloads']}\n"
         f"💾 Size: {humanbytes(stats['total_size'])}\n"
-        f"🕒 Auto-Delete Files: {stats.get('active_autodelete_files', 0)}\n\n"
-        f"⏱ Current Auto-Delete Time: {getattr(config, 'DEFAULT_AUTO_DELETE', 30)} minutes"
+        f"🕒 Auto-Delete Files: {stats.get('active_autodelete_files', 0)}\n"
+        f"🗑 Pending Deletions: {deletions['queue_depth']} (max lateness {deletions['max_lateness']:.1f}s)\n"
+        f"🧠 File Cache: {metadata_cache['hit_rate']:.0%} hits, {metadata_cache['entries']} entries, "
+        f"{humanbytes(metadata_cache['bytes'])}, {metadata_cache['evictions']} evictions\n"
+        f"🔔 Force-Sub Cache: {fsub_cache['hit_rate']:.0%} hits, {fsub_cache['entries']} entries\n"
+        f"⏳ Loop Lag: p50 {loop_lag['p50'] * 1000:.1f} ms, p99 {loop_lag['p99'] * 1000:.1f} ms, "
+        f"{loop_lag['stalls']} stalls\n"
+        f"🚦 Outbound Queues: {', '.join(f'{name} {depth}' for name, depth in lanes.items())}\n"
+        f"🛡 Shed Requests: {client.request_guard.shed}\n\n"
+        f"⏱ Current Auto-Delete Time: {client.settings.get('auto_delete_time')} minutes"
     )
     await message.reply_text(stats_text)
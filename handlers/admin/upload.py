@@ -1,14 +1,13 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message
-from database import Database
 from utils import ButtonManager, is_admin, humanbytes
+from utils.metrics import metrics
 import config
-import uuid
 
-db = Database()
 button_manager = ButtonManager()
 
 @Client.on_message(filters.command("upload") & filters.reply)
+@metrics.timed("handler_duration_seconds", handler="upload")
 async def upload_command(client: Client, message: Message):
     if not is_admin(message):
         await message.reply_text("⚠️ You are not authorized to upload files!")
@@ -29,11 +28,12 @@ async def upload_command(client: Client, message: Message):
             "file_name": "Unknown",
             "file_size": 0,
             "file_type": None,
-            "uuid": str(uuid.uuid4()),
             "uploader_id": message.from_user.id,
             "message_id": forwarded_msg.id,
             "auto_delete": True,
-            "auto_delete_time": getattr(config, 'DEFAULT_AUTO_DELETE', 30)
+            "auto_delete_time": client.settings.get("auto_delete_time"),
+            # Kept so the file can be re-sent from its cached file_id
+            "caption": replied_msg.caption.html if replied_msg.caption else ""
         }
 
         if replied_msg.document:
@@ -60,28 +60,28 @@ async def upload_command(client: Client, message: Message):
         elif replied_msg.photo:
             file_data.update({
                 "file_id": replied_msg.photo.file_id,
-                "file_name": f"photo_{file_data['uuid']}.jpg",
+                "file_name": f"photo_{forwarded_msg.id}.jpg",
                 "file_size": replied_msg.photo.file_size,
                 "file_type": "photo"
             })
         elif replied_msg.voice:
             file_data.update({
                 "file_id": replied_msg.voice.file_id,
-                "file_name": f"voice_{file_data['uuid']}.ogg",
+                "file_name": f"voice_{forwarded_msg.id}.ogg",
                 "file_size": replied_msg.voice.file_size,
                 "file_type": "voice"
             })
         elif replied_msg.video_note:
             file_data.update({
                 "file_id": replied_msg.video_note.file_id,
-                "file_name": f"video_note_{file_data['uuid']}.mp4",
+                "file_name": f"video_note_{forwarded_msg.id}.mp4",
                 "file_size": replied_msg.video_note.file_size,
                 "file_type": "video_note"
             })
         elif replied_msg.animation:
             file_data.update({
                 "file_id": replied_msg.animation.file_id,
-                "file_name": replied_msg.animation.file_name or f"animation_{file_data['uuid']}.gif",
+                "file_name": replied_msg.animation.file_name or f"animation_{forwarded_msg.id}.gif",
                 "file_size": replied_msg.animation.file_size,
                 "file_type": "animation"
             })
@@ -97,8 +97,8 @@ async def upload_command(client: Client, message: Message):
             await status_msg.edit_text(f"❌ **File too large!**\nMaximum size: {humanbytes(config.MAX_FILE_SIZE)}")
             return
 
-        file_uuid = await db.add_file(file_data)
-        share_link = f"https://t.me/{config.BOT_USERNAME}?start={file_uuid}"
+        file_code = await client.db.add_file(file_data)
+        share_link = f"https://t.me/{config.BOT_USERNAME}?start={file_code}"
         
         upload_success_text = (
             f"✅ **File Upload Successful**\n\n"
@@ -112,7 +112,7 @@ async def upload_command(client: Client, message: Message):
         
         await status_msg.edit_text(
             upload_success_text,
-            reply_markup=button_manager.file_button(file_uuid)
+            reply_markup=button_manager.file_button(file_code)
         )
 
     except Exception as e:
@@ -1,13 +1,14 @@
 from pyrogram import Client, filters
 from pyrogram.types import CallbackQuery
-from database import Database
 from utils import ButtonManager, is_admin
+from utils.delivery import send_file
+from utils.metrics import metrics
 import config
 
-db = Database()
 button_manager = ButtonManager()
 
 @Client.on_callback_query()
+@metrics.timed("handler_duration_seconds", handler="callback")
 async def callback_handler(client: Client, callback: CallbackQuery):
     if callback.data == "home":
         await button_manager.show_start(client, callback)
@@ -19,6 +20,16 @@ async def callback_handler(client: Client, callback: CallbackQuery):
         await button_manager.show_about(client, callback)
     
     elif callback.data.startswith("download_"):
+        file_key = callback.data.split("_")[1]
+        reason = await client.request_guard.check("callback", callback.from_user.id, file_key)
+        if reason:
+            if client.request_guard.should_notify(reason, callback.from_user.id, file_key):
+                await callback.answer("⏳ Too many requests. Please slow down.", show_alert=True)
+            else:
+                # Stops the client's loading spinner; no message, so it stays cheap
+                await callback.answer()
+            return
+
         # Check force subscription
         if not await button_manager.check_force_sub(client, callback.from_user.id):
             await callback.answer(
@@ -28,21 +39,13 @@ async def callback_handler(client: Client, callback: CallbackQuery):
             return
             
         file_uuid = callback.data.split("_")[1]
-        file_data = await db.get_file(file_uuid)
-        
-        if not file_data:
-            await callback.answer("File not found!", show_alert=True)
+        # Shares in-flight deliveries with /start, so a double tap sends the file once
+        delivered, duplicate = await client.inflight.run(
+            (callback.from_user.id, file_uuid),
+            lambda: deliver_callback_file(client, callback, file_uuid)
+        )
+        if not delivered and not duplicate:
             return
-            
-        try:
-            await client.copy_message(
-                chat_id=callback.message.chat.id,
-                from_chat_id=config.DB_CHANNEL_ID,
-                message_id=file_data["msg_id"]
-            )
-            await db.increment_downloads(file_uuid)
-        except Exception as e:
-            await callback.answer(f"Error: {str(e)}", show_alert=True)
     
     elif callback.data.startswith("share_"):
         file_uuid = callback.data.split("_")[1]
@@ -53,4 +56,19 @@ async def callback_handler(client: Client, callback: CallbackQuery):
         )
     
     await callback.answer()
-    
+
+
+async def deliver_callback_file(client: Client, callback: CallbackQuery, file_uuid: str) -> bool:
+    file_data = await client.db.get_file(file_uuid)
+
+    if not file_data:
+        await callback.answer("File not found!", show_alert=True)
+        return False
+
+    try:
+        msg = await send_file(client, callback.message.chat.id, file_data, protect_content=client.settings.get("privacy_mode"))
+        await client.db.record_delivery(file_data["uuid"], callback.message.chat.id, msg.id)
+        return True
+    except Exception as e:
+        await callback.answer(f"Error: {str(e)}", show_alert=True)
+        return False
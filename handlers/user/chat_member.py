@@ -0,0 +1,11 @@
+from pyrogram import Client, filters
+from pyrogram.types import ChatMemberUpdated
+import config
+
+
+@Client.on_chat_member_updated(filters.chat(config.FORCE_SUB_CHANNELS))
+async def force_sub_member_updated(client: Client, update: ChatMemberUpdated):
+    # Only delivered while the bot is an admin of the channel
+    member = update.new_chat_member or update.old_chat_member
+    if member and member.user:
+        client.force_sub.invalidate(update.chat.id, member.user.id)
@@ -1,30 +1,17 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from pyrogram.errors import UserNotParticipant
-from database import Database
 from datetime import datetime
 import config
-import asyncio
 from handlers.utils.message_delete import schedule_message_deletion
 from utils.button_manager import ButtonManager
+from utils.delivery import MAX_COPY_IDS, copy_messages, send_file
+from utils.metrics import metrics
+from utils.outbound import lane
 
-db = Database()
 button_manager = ButtonManager()
 
 async def check_force_sub(client: Client, user_id: int) -> bool:
-    if not config.FORCE_SUB_CHANNELS:
-        return True
-    
-    for channel_id in config.FORCE_SUB_CHANNELS:
-        try:
-            member = await client.get_chat_member(channel_id, user_id)
-            if member.status not in ["member", "administrator", "creator"]:
-                return False
-        except UserNotParticipant:
-            return False
-        except Exception:
-            continue
-    return True
+    return await client.force_sub.check(client, user_id)
 
 def get_force_sub_buttons(file_id=None):
     buttons = []
@@ -47,78 +34,35 @@ def get_force_sub_buttons(file_id=None):
     return buttons
 
 @Client.on_message(filters.command("start"))
+@metrics.timed("handler_duration_seconds", handler="start")
 async def start_command(client: Client, message: Message):
-    await db.add_user(message.from_user.id, message.from_user.username)
-
     file_id = message.command[1] if len(message.command) > 1 else None
 
+    reason = await client.request_guard.check("start", message.from_user.id, file_id)
+    if reason:
+        if client.request_guard.should_notify(reason, message.from_user.id, file_id):
+            await message.reply_text(
+                f"⏳ Too many requests. Please try again in {client.request_guard.retry_after(reason):.0f} seconds."
+            )
+        return
+
+    client.db.track_user(message.from_user.id, message.from_user.username)
+
     if not await check_force_sub(client, message.from_user.id):
         await message.reply_text(
             "⚠️ Access Restricted\n\nPlease join our channel first and click 'Refresh' to continue.",
             reply_markup=InlineKeyboardMarkup(get_force_sub_buttons(file_id)),
-            protect_content=config.PRIVACY_MODE
+            protect_content=client.settings.get("privacy_mode")
         )
         return
 
     if file_id:
-        if file_id.startswith("batch_"):
-            await handle_batch_download(client, message, file_id.split("_")[1])
-            return
-            
-        file_data = await db.get_file(file_id)
-        if not file_data:
-            await message.reply_text(
-                "❌ File not found or has been deleted!", 
-                protect_content=config.PRIVACY_MODE
-            )
-            return
-
-        try:
-            msg = await client.copy_message(
-                chat_id=message.chat.id,
-                from_chat_id=config.DB_CHANNEL_ID,
-                message_id=file_data["message_id"],
-                protect_content=config.PRIVACY_MODE
-            )
-
-            await db.increment_downloads(file_id)
-            await db.update_file_message_id(file_id, msg.id, message.chat.id)
-
-            if file_data.get("auto_delete"):
-                delete_time = file_data.get("auto_delete_time", config.AUTO_DELETE_TIME)
-                info_msg = await msg.reply_text(
-                    config.Messages.FILE_TEXT.format(
-                        file_name=file_data.get("file_name", "Unknown"),
-                        file_size=file_data.get("file_size", "Unknown"),
-                        file_type=file_data.get("file_type", "Unknown"),
-                        downloads=file_data.get("downloads", 0),
-                        upload_time=datetime.fromtimestamp(
-                            file_data.get("upload_time", datetime.now().timestamp())
-                        ).strftime("%Y-%m-%d %H:%M:%S"),
-                        uploader=file_data.get("uploader_username", "Anonymous"),
-                        share_link=f"https://t.me/{config.BOT_USERNAME}?start={file_id}"
-                    ),
-                    reply_markup=InlineKeyboardMarkup(
-                        config.Buttons.file_buttons(file_id)
-                    ),
-                    protect_content=config.PRIVACY_MODE
-                )
-
-                asyncio.create_task(
-                    schedule_message_deletion(
-                        client, 
-                        file_id, 
-                        message.chat.id, 
-                        [msg.id, info_msg.id], 
-                        delete_time
-                    )
-                )
-
-        except Exception as e:
-            await message.reply_text(
-                f"❌ Error: {str(e)}", 
-                protect_content=config.PRIVACY_MODE
-            )
+        # A double-tapped link is delivered once: duplicates wait for the first
+        # delivery, and repeats right after a successful one are dropped
+        await client.inflight.run(
+            (message.from_user.id, file_id),
+            lambda: deliver_start_link(client, message, file_id)
+        )
         return
 
     await message.reply_text(
@@ -127,23 +71,83 @@ async def start_command(client: Client, message: Message):
             user_mention=message.from_user.mention
         ),
         reply_markup=InlineKeyboardMarkup(config.Buttons.start_buttons()),
-        protect_content=config.PRIVACY_MODE
+        protect_content=client.settings.get("privacy_mode")
     )
 
+async def deliver_start_link(client: Client, message: Message, file_id: str) -> bool:
+    """Deliver the file or batch behind a /start link; True if it was sent."""
+    if file_id.startswith("batch_"):
+        return await handle_batch_download(client, message, file_id.split("_")[1])
+        
+    file_data = await client.db.get_file(file_id)
+    if not file_data:
+        await message.reply_text(
+            "❌ File not found or has been deleted!", 
+            protect_content=client.settings.get("privacy_mode")
+        )
+        return False
+
+    # Links made before share codes carry the uuid; accounting always uses it
+    file_uuid = file_data["uuid"]
+    share_code = file_data.get("code") or file_uuid
+    try:
+        msg = await send_file(client, message.chat.id, file_data, protect_content=client.settings.get("privacy_mode"))
+
+        delete_time = None
+        if file_data.get("auto_delete"):
+            delete_time = file_data.get("auto_delete_time", config.AUTO_DELETE_TIME)
+        await client.db.record_delivery(file_uuid, message.chat.id, msg.id, delete_time)
+
+        if file_data.get("auto_delete"):
+            info_msg = await msg.reply_text(
+                config.Messages.FILE_TEXT.format(
+                    file_name=file_data.get("file_name", "Unknown"),
+                    file_size=file_data.get("file_size", "Unknown"),
+                    file_type=file_data.get("file_type", "Unknown"),
+                    downloads=file_data.get("downloads", 0),
+                    upload_time=datetime.fromtimestamp(
+                        file_data.get("upload_time", datetime.now().timestamp())
+                    ).strftime("%Y-%m-%d %H:%M:%S"),
+                    uploader=file_data.get("uploader_username", "Anonymous"),
+                    share_link=f"https://t.me/{config.BOT_USERNAME}?start={share_code}"
+                ),
+                reply_markup=InlineKeyboardMarkup(
+                    config.Buttons.file_buttons(share_code)
+                ),
+                protect_content=client.settings.get("privacy_mode")
+            )
+
+            await schedule_message_deletion(
+                client,
+                file_uuid,
+                message.chat.id,
+                [msg.id, info_msg.id],
+                delete_time
+            )
+        return True
+
+    except Exception as e:
+        await message.reply_text(
+            f"❌ Error: {str(e)}", 
+            protect_content=client.settings.get("privacy_mode")
+        )
+        return False
+
 @Client.on_message(filters.command("upload") & filters.private & filters.reply)
+@metrics.timed("handler_duration_seconds", handler="upload")
 async def upload_command(client: Client, message: Message):
     if not await check_force_sub(client, message.from_user.id):
         await message.reply_text(
             "⚠️ Access Restricted\n\nPlease join our channel first and click 'Refresh' to continue.",
             reply_markup=InlineKeyboardMarkup(get_force_sub_buttons()),
-            protect_content=config.PRIVACY_MODE
+            protect_content=client.settings.get("privacy_mode")
         )
         return
 
     if message.from_user.id not in config.ADMIN_IDS:
         await message.reply_text(
             "❌ Only admins can upload files.",
-            protect_content=config.PRIVACY_MODE
+            protect_content=client.settings.get("privacy_mode")
         )
         return
 
@@ -158,7 +162,7 @@ async def upload_command(client: Client, message: Message):
         await message.reply_text(
             "❌ Please reply to a supported file type:\n" + 
             ", ".join(config.SUPPORTED_TYPES),
-            protect_content=config.PRIVACY_MODE
+            protect_content=client.settings.get("privacy_mode")
         )
         return
 
@@ -166,11 +170,11 @@ async def upload_command(client: Client, message: Message):
     if file_size > config.MAX_FILE_SIZE:
         await message.reply_text(
             f"❌ File size too large. Maximum allowed size is {config.MAX_FILE_SIZE/(1024*1024)}MB",
-            protect_content=config.PRIVACY_MODE
+            protect_content=client.settings.get("privacy_mode")
         )
         return
 
-    file_uuid = await db.save_file(file_message, message.from_user.id)
+    file_uuid = await client.db.save_file(file_message, message.from_user.id)
     
     await message.reply_text(
         f"✅ **File Successfully Uploaded!**\n\n"
@@ -182,7 +186,7 @@ async def upload_command(client: Client, message: Message):
                 url=f"https://t.me/share/url?url=https://t.me/{config.BOT_USERNAME}?start={file_uuid}"
             )]
         ]),
-        protect_content=config.PRIVACY_MODE
+        protect_content=client.settings.get("privacy_mode")
     )
 
 @Client.on_message(filters.command("batch_upload") & filters.private & filters.reply)
@@ -191,14 +195,14 @@ async def batch_upload_command(client: Client, message: Message):
         await message.reply_text(
             "⚠️ Access Restricted\n\nPlease join our channel first and click 'Refresh' to continue.",
             reply_markup=InlineKeyboardMarkup(get_force_sub_buttons()),
-            protect_content=config.PRIVACY_MODE
+            protect_content=client.settings.get("privacy_mode")
         )
         return
 
     if not message.reply_to_message or not message.reply_to_message.media_group_id:
         await message.reply_text(
             "❌ Please reply to an album (grouped files) to upload as a batch.",
-            protect_content=config.PRIVACY_MODE
+            protect_content=client.settings.get("privacy_mode")
         )
         return
 
@@ -208,11 +212,11 @@ async def batch_upload_command(client: Client, message: Message):
     if not media_messages:
         await message.reply_text(
             "❌ No files found in the media group.",
-            protect_content=config.PRIVACY_MODE
+            protect_content=client.settings.get("privacy_mode")
         )
         return
 
-    batch_uuid = await db.save_batch(media_messages, message.from_user.id)
+    batch_uuid = await client.db.save_batch(media_messages, message.from_user.id)
 
     await message.reply_text(
         f"✅ **Batch Successfully Uploaded!**\n\n"
@@ -224,54 +228,83 @@ async def batch_upload_command(client: Client, message: Message):
                 url=f"https://t.me/{config.BOT_USERNAME}?start=batch_{batch_uuid}"
             )]
         ]),
-        protect_content=config.PRIVACY_MODE
+        protect_content=client.settings.get("privacy_mode")
     )
 
-async def handle_batch_download(client: Client, message: Message, batch_uuid: str):
-    batch_data = await db.get_batch(batch_uuid)
+@metrics.timed("handler_duration_seconds", handler="batch_download")
+async def handle_batch_download(client: Client, message: Message, batch_uuid: str) -> bool:
+    batch_data = await client.db.get_batch(batch_uuid)
     
     if not batch_data:
         await message.reply_text(
             "❌ Batch not found or has been deleted!",
-            protect_content=config.PRIVACY_MODE
+            protect_content=client.settings.get("privacy_mode")
         )
-        return
+        return False
+
+    files = batch_data["files"]
+    user_id = message.from_user.id
+    sent = await client.db.get_batch_progress(user_id, batch_uuid)
+    if sent >= len(files):
+        sent = 0
 
     info_msg = await message.reply_text(
-        f"📦 **Batch Download Started**\n"
-        f"Total files: {len(batch_data['files'])}\n"
-        f"Please wait while I send all files...",
-        protect_content=config.PRIVACY_MODE
+        f"📦 **Batch Download {'Resumed' if sent else 'Started'}**\n"
+        f"Total files: {len(files)}\n"
+        + (f"Continuing from file {sent + 1}...\n" if sent else "Please wait while I send all files..."),
+        protect_content=client.settings.get("privacy_mode")
     )
 
-    success_count = 0
-    for file_data in batch_data["files"]:
+    resumed_from = sent
+    delivered = 0
+    while sent < len(files):
+        chunk = files[sent:sent + min(config.BATCH_CHUNK_SIZE, MAX_COPY_IDS)]
         try:
-            msg = await client.copy_message(
-                chat_id=message.chat.id,
-                from_chat_id=config.DB_CHANNEL_ID,
-                message_id=file_data["message_id"],
-                protect_content=config.PRIVACY_MODE
-            )
-            
-            await db.increment_downloads(file_data["file_uuid"])
-            await db.update_file_message_id(
-                file_data["file_uuid"],
-                msg.id,
-                message.chat.id
-            )
-            
-            success_count += 1
-            await asyncio.sleep(1)
-            
+            # Paced per chat by the outbound scheduler, behind single-file deliveries
+            with lane("batch"):
+                new_ids = await copy_messages(
+                    client,
+                    message.chat.id,
+                    config.DB_CHANNEL_ID,
+                    [batch_message_id(file_data) for file_data in chunk],
+                    protect_content=client.settings.get("privacy_mode")
+                )
         except Exception as e:
+            # Progress still points at the start of this chunk, so opening the
+            # link again resumes with the files that weren't sent
             await message.reply_text(
-                f"❌ Error sending file: {str(e)}",
-                protect_content=config.PRIVACY_MODE
+                f"❌ Error sending files: {str(e)}\n"
+                f"Sent {sent}/{len(files)} files. Open the link again to continue.",
+                protect_content=client.settings.get("privacy_mode")
             )
+            return False
+
+        for file_data, msg_id in zip(chunk, new_ids):
+            if not msg_id:
+                continue
+            delivered += 1
+            if file_data.get("file_uuid"):
+                await client.db.record_delivery(file_data["file_uuid"], message.chat.id, msg_id)
+
+        sent += len(chunk)
+        await client.db.set_batch_progress(user_id, batch_uuid, sent)
+        if sent < len(files):
+            try:
+                await info_msg.edit_text(
+                    f"📦 **Batch Download In Progress**\n"
+                    f"Sent: {sent}/{len(files)} files"
+                )
+            except Exception:
+                pass
 
+    await client.db.clear_batch_progress(user_id, batch_uuid)
     await info_msg.edit_text(
         f"📦 **Batch Download Completed**\n"
-        f"Successfully sent: {success_count}/{len(batch_data['files'])} files",
-        protect_content=config.PRIVACY_MODE
+        f"Successfully sent: {delivered}/{len(files) - resumed_from} files"
+        + (f" (resumed from file {resumed_from + 1})" if resumed_from else "")
     )
+    return True
+
+def batch_message_id(file_data: dict) -> int:
+    # Admin batch uploads store the DB channel message id under "file_id"
+    return file_data.get("message_id") or file_data["file_id"]
@@ -1,12 +1,34 @@
 #AlphaShare bot join @Thealphabotz
 from pyrogram import Client, idle
+from pyrogram.errors import FloodWait
+from pyrogram.handlers import ConversationHandler, DisconnectHandler, ErrorHandler
 from web import start_webserver, ping_server
 from database import Database
+from utils.broadcast import BroadcastManager
+from utils.deletion_scheduler import DeletionScheduler
+from utils.force_sub import ForceSubChecker
+from utils.invalidation import CacheInvalidator
+from utils.loop_monitor import LoopLagMonitor
+from utils.logger import setup_logging, stop_logging
+from utils.metrics import metrics
+from utils.outbound import OutboundScheduler, lane_updates
+from utils.request_guard import RequestGuard
+from utils.timing import span, time_updates
+from utils.settings import SettingsStore
+from utils.singleflight import SingleFlight
+from utils.shortener import ModijiProvider, ShortenerClient
 import config
 import asyncio
+import logging
 import os
 import time
 
+logger = logging.getLogger(__name__)
+
+# Callbacks that don't handle an update of ours: no (client, update) pair, or
+# the client's own conversation listener
+UNWRAPPED_HANDLERS = (ConversationHandler, DisconnectHandler, ErrorHandler)
+
 
 class FileShareBot(Client):
     def __init__(self):
@@ -17,11 +39,124 @@ class FileShareBot(Client):
             bot_token=config.BOT_TOKEN,
             plugins=dict(root="handlers")
         )
-        self.db = Database()
+        self.db = None
+        self.deletion_scheduler = DeletionScheduler(self)
+        self.force_sub = ForceSubChecker()
+        self.broadcasts = BroadcastManager(self)
+        self.outbound = OutboundScheduler()
+        self.invalidator = CacheInvalidator(self)
+        self.loop_monitor = LoopLagMonitor()
+        self.settings = SettingsStore(self)
+        self.request_guard = RequestGuard(self)
+        self.inflight = SingleFlight(config.DELIVERY_DEDUPE_WINDOW)
+        self.shortener = ShortenerClient(self, ModijiProvider(config.MODIJI_API_KEY))
+        self.settings.on_change("broadcast_rate", self.broadcasts.bucket.set_rate)
+        self.settings.on_change("deletion_rate", self.deletion_scheduler.executor.bucket.set_rate)
+        self.settings.on_change("user_rate_limit", lambda limit: setattr(self.request_guard.users, "limit", limit))
+        self.settings.on_change("file_rate_limit", lambda limit: setattr(self.request_guard.files, "limit", limit))
+        self.background_tasks = []
+        metrics.add_collector(self.collect_metrics)
         print("Bot Initialized!")
 
+    def add_handler(self, handler, group: int = 0):
+        # Plugins register through here (the dispatcher only adds them later,
+        # from a task): time every update a handler processes and send admins'
+        # requests through the admin lane
+        if not isinstance(handler, UNWRAPPED_HANDLERS):
+            # Handlers that support listeners call the plugin's function as original_callback
+            attr = "original_callback" if hasattr(handler, "original_callback") else "callback"
+            setattr(handler, attr, time_updates(lane_updates(getattr(handler, attr))))
+        return super().add_handler(handler, group)
+
+    async def invoke(self, query, *args, **kwargs):
+        # Every outbound Telegram request (copy_message, delete_messages, raw calls...) ends up here
+        return await self.outbound.call(self._send_request, query, *args, **kwargs)
+
+    async def _send_request(self, query, *args, **kwargs):
+        method = getattr(query, "QUALNAME", type(query).__name__)
+        started = time.perf_counter()
+        error = False
+        try:
+            with span("telegram", method):
+                return await super().invoke(query, *args, **kwargs)
+        except FloodWait as e:
+            error = True
+            metrics.inc("telegram_flood_waits_total", method=method)
+            metrics.inc("telegram_flood_wait_seconds_total", e.value, method=method)
+            raise
+        except BaseException:
+            error = True
+            raise
+        finally:
+            metrics.observe("telegram_request_duration_seconds", time.perf_counter() - started, error, method=method)
+
+    def collect_metrics(self):
+        """Gauges read from the bot's components when /metrics is scraped."""
+        lag = self.loop_monitor.stats()
+        yield "event_loop_lag_seconds", {"quantile": "0.5"}, lag["p50"]
+        yield "event_loop_lag_seconds", {"quantile": "0.99"}, lag["p99"]
+        yield "event_loop_lag_max_seconds", {}, lag["max"]
+        yield "event_loop_stalls_total", {}, lag["stalls"]
+        yield "event_loop_blocking_calls_total", {}, lag["blocking_calls"]
+
+        caches = {"force_sub": self.force_sub.cache, "shortener": self.shortener.cache}
+        if self.db:
+            caches["metadata"] = self.db.metadata_cache
+            for buffer in (self.db.user_activity, self.db.delivery_buffer):
+                buffer_stats = buffer.stats()
+                yield "write_buffer_pending", {"buffer": buffer.name}, buffer_stats["pending"]
+                yield "write_buffer_flushed_items_total", {"buffer": buffer.name}, buffer_stats["flushed_items"]
+                yield "write_buffer_max_flush_lag_seconds", {"buffer": buffer.name}, buffer_stats["max_flush_lag"]
+        for name, cache in caches.items():
+            cache_stats = cache.stats()
+            yield "cache_entries", {"cache": name}, cache_stats["entries"]
+            yield "cache_bytes", {"cache": name}, cache_stats["bytes"]
+            yield "cache_hits_total", {"cache": name}, cache_stats["hits"]
+            yield "cache_misses_total", {"cache": name}, cache_stats["misses"]
+            yield "cache_evictions_total", {"cache": name}, cache_stats["evictions"]
+
+        yield "deletions_executed_total", {}, self.deletion_scheduler.executed
+        yield "deletions_failed_total", {}, self.deletion_scheduler.failed
+        yield "deletions_abandoned_total", {}, self.deletion_scheduler.abandoned
+        yield "deletion_max_lateness_seconds", {}, self.deletion_scheduler.max_lateness
+        yield "deletion_flood_waits_total", {}, self.deletion_scheduler.executor.flood_waits
+        yield "broadcasts_running", {}, self.broadcasts.running
+        yield "outbound_flood_waits_total", {}, self.outbound.flood_waits
+        inflight = self.inflight.stats()
+        yield "deliveries_inflight", {}, inflight["inflight"]
+        yield "deliveries_deduplicated_total", {"reason": "coalesced"}, inflight["coalesced"]
+        yield "deliveries_deduplicated_total", {"reason": "suppressed"}, inflight["suppressed"]
+        for lane_name, depth in self.outbound.stats().items():
+            yield "outbound_queue_depth", {"lane": lane_name}, depth
+
+    async def health(self):
+        """Mongo and Telegram connectivity for /healthz."""
+        checks = {"telegram": bool(self.is_connected), "mongo": False}
+        if self.db:
+            try:
+                await asyncio.wait_for(self.db.db.command("ping"), timeout=config.HEALTHZ_TIMEOUT)
+                checks["mongo"] = True
+            except Exception as e:
+                logger.warning(f"Health check failed (mongo): {str(e)}")
+        return checks
+
     async def start(self):
+        self.loop_monitor.start()
+        self.db = Database()
+        await self.db.connect()
+        await self.settings.reload()
+        self.invalidator.start()
         await super().start()
+        self.deletion_scheduler.start()
+        self.background_tasks.append(asyncio.create_task(self.broadcasts.resume_periodically()))
+        self.background_tasks.append(
+            asyncio.create_task(self.db.reconcile_stats_periodically(config.STATS_RECONCILE_INTERVAL))
+        )
+        self.background_tasks.append(
+            asyncio.create_task(
+                self.db.prune_unreachable_users_periodically(config.USER_PRUNE_INTERVAL, config.USER_PRUNE_AFTER_DAYS)
+            )
+        )
         me = await self.get_me()
         print(f"Bot Started as {me.first_name}")
         print(f"Username: @{me.username}")
@@ -30,10 +165,22 @@ class FileShareBot(Client):
        
 
     async def stop(self):
+        for task in self.background_tasks:
+            task.cancel()
+        self.background_tasks.clear()
+        await self.broadcasts.stop()
+        await self.deletion_scheduler.stop()
         await super().stop()
+        await self.invalidator.stop()
+        await self.shortener.close()
+        if self.db:
+            await self.db.close()
+            self.db = None
+        await self.loop_monitor.stop()
         print("Bot Stopped. Bye!")
 
 async def main():
+    setup_logging()
     bot = FileShareBot()
     
     try:
@@ -41,7 +188,7 @@ async def main():
         await bot.start()
         print("Bot is Running!")
         if config.WEB_SERVER:
-            asyncio.create_task(start_webserver())
+            asyncio.create_task(start_webserver(bot))
             asyncio.create_task(ping_server(config.PING_URL, config.PING_TIME))
             
         await idle()
@@ -50,6 +197,7 @@ async def main():
     finally:
         await bot.stop()
         print("Bot Stopped!")
+        stop_logging()
 
 
 if __name__ == "__main__":
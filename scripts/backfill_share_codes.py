@@ -0,0 +1,34 @@
+"""
+Give files uploaded before share codes a short base62 code.
+
+Usage:
+    python -m scripts.backfill_share_codes [mongo_uri] [database_name]
+
+Defaults to MONGO_URI / DATABASE_NAME from the environment. Safe to run
+while the bot is up and to re-run: only files without a code are touched.
+Old uuid links keep working either way; the code is what new share links
+for those files use.
+"""
+import asyncio
+import sys
+
+import config
+from database import Database
+
+
+async def backfill() -> int:
+    if len(sys.argv) > 1:
+        config.MONGO_URI = sys.argv[1]
+    if len(sys.argv) > 2:
+        config.DATABASE_NAME = sys.argv[2]
+
+    db = Database()
+    try:
+        await db.connect()
+        return await db.backfill_share_codes()
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    print(f"Assigned share codes to {asyncio.run(backfill())} files")
@@ -0,0 +1,194 @@
+"""
+Compare the latency of the file delivery paths through Pyrogram itself.
+
+Usage:
+    python -m scripts.bench_delivery [deliveries] [rpc_latency_ms]
+
+send_file() runs against a real (never connected) Pyrogram Client whose
+invoke() is replaced by a fake Telegram: every raw request is answered
+after `rpc_latency_ms` with the response Telegram would send, and counted
+per request type. How many round trips a delivery costs is therefore
+decided by Pyrogram's copy_message / send_cached_media, not by the fake.
+The "stale" run gives send_file an expired file reference, so it measures
+the FileReferenceExpired fallback to copying.
+"""
+import asyncio
+import statistics
+import sys
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from pyrogram import Client, raw, utils
+from pyrogram.errors import FileReferenceExpired
+from pyrogram.file_id import FileId, FileType
+
+import config
+from utils.delivery import send_file
+
+USER_ID = 1000
+DOCUMENT_ID = 5000
+ACCESS_HASH = 6000
+FILE_REFERENCE = b"\x01fresh"
+EXPIRED_REFERENCE = b"\x01expired"
+
+
+def _document(file_reference: bytes) -> raw.types.Document:
+    return raw.types.Document(
+        id=DOCUMENT_ID,
+        access_hash=ACCESS_HASH,
+        file_reference=file_reference,
+        date=0,
+        mime_type="application/octet-stream",
+        size=1024,
+        dc_id=2,
+        attributes=[raw.types.DocumentAttributeFilename(file_name="bench.bin")],
+        thumbs=[],
+    )
+
+
+def _channel_id() -> int:
+    # DB_CHANNEL_ID is the -100-prefixed Bot API id; raw objects carry the bare one
+    return utils.MAX_CHANNEL_ID - config.DB_CHANNEL_ID
+
+
+def _file_id(file_reference: bytes) -> str:
+    return FileId(
+        file_type=FileType.DOCUMENT,
+        dc_id=2,
+        media_id=DOCUMENT_ID,
+        access_hash=ACCESS_HASH,
+        file_reference=file_reference,
+    ).encode()
+
+
+class FakeTelegram:
+    """Stands in for Client.invoke; answers the requests a delivery makes."""
+
+    def __init__(self, rpc_latency: float):
+        self.rpc_latency = rpc_latency
+        self.requests = Counter()
+        self._next_id = 1
+
+    def _message(self, peer, message_id: int) -> raw.types.Message:
+        return raw.types.Message(
+            id=message_id,
+            peer_id=peer,
+            date=int(time.time()),
+            message="",
+            entities=[],
+            media=raw.types.MessageMediaDocument(document=_document(FILE_REFERENCE)),
+        )
+
+    def _channel(self) -> raw.types.Channel:
+        return raw.types.Channel(
+            id=_channel_id(),
+            title="DB",
+            photo=raw.types.ChatPhotoEmpty(),
+            date=0,
+            access_hash=0,
+            broadcast=True,
+            usernames=[],
+            restriction_reason=[],
+        )
+
+    def _user(self) -> raw.types.User:
+        return raw.types.User(id=USER_ID, access_hash=0, first_name="Bench", usernames=[], restriction_reason=[])
+
+    async def invoke(self, query, *args, **kwargs):
+        self.requests[query.QUALNAME] += 1
+        await asyncio.sleep(self.rpc_latency)
+
+        if isinstance(query, raw.functions.channels.GetMessages):
+            channel = raw.types.PeerChannel(channel_id=_channel_id())
+            return raw.types.messages.ChannelMessages(
+                pts=0,
+                count=len(query.id),
+                messages=[self._message(channel, message.id) for message in query.id],
+                topics=[],
+                chats=[self._channel()],
+                users=[],
+            )
+
+        if isinstance(query, raw.functions.messages.SendMedia):
+            if getattr(getattr(query.media, "id", None), "file_reference", None) == EXPIRED_REFERENCE:
+                raise FileReferenceExpired()
+            self._next_id += 1
+            return raw.types.Updates(
+                updates=[
+                    raw.types.UpdateMessageID(id=self._next_id, random_id=query.random_id),
+                    raw.types.UpdateNewMessage(
+                        message=self._message(raw.types.PeerUser(user_id=USER_ID), self._next_id),
+                        pts=0,
+                        pts_count=0,
+                    ),
+                ],
+                users=[self._user()],
+                chats=[],
+                date=int(time.time()),
+                seq=0,
+            )
+
+        raise NotImplementedError(query.QUALNAME)
+
+
+async def make_client(rpc_latency: float) -> Client:
+    client = Client("bench", api_id=1, api_hash="0" * 32, in_memory=True, no_updates=True)
+    await client.storage.open()
+    await client.storage.update_peers([
+        (config.DB_CHANNEL_ID, 0, "channel", None, None),
+        (USER_ID, 0, "user", None, None),
+    ])
+    # Never connected: every request goes to the fake instead
+    client.is_connected = True
+    fake = FakeTelegram(rpc_latency)
+    client.invoke = fake.invoke
+    client.fake = fake
+
+    async def update_file_id(uuid, file_id):
+        pass
+
+    client.db = SimpleNamespace(update_file_id=update_file_id)
+    return client
+
+
+async def bench(name: str, mode: str, file_reference: bytes, deliveries: int, rpc_latency: float):
+    config.DELIVERY_MODE = mode
+    client = await make_client(rpc_latency)
+    file_data = {
+        "uuid": "bench",
+        "file_id": _file_id(file_reference),
+        "caption": "",
+        "message_id": 1,
+        "file_type": "document",
+    }
+    timings = []
+    try:
+        for _ in range(deliveries):
+            start = time.perf_counter()
+            await send_file(client, USER_ID, file_data)
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        await client.storage.close()
+
+    timings.sort()
+    requests = client.fake.requests
+    print(
+        f"{name:>6}: mean {statistics.mean(timings):7.2f} ms  "
+        f"p50 {timings[len(timings) // 2]:7.2f} ms  "
+        f"p99 {timings[int(len(timings) * 0.99) - 1]:7.2f} ms  "
+        f"requests/delivery {sum(requests.values()) / deliveries:.1f} "
+        f"({', '.join(f'{qualname} {count / deliveries:.1f}' for qualname, count in sorted(requests.items()))})"
+    )
+
+
+async def main():
+    deliveries = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rpc_latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    await bench("copy", "copy", FILE_REFERENCE, deliveries, rpc_latency)
+    await bench("cached", "cached", FILE_REFERENCE, deliveries, rpc_latency)
+    await bench("stale", "cached", EXPIRED_REFERENCE, deliveries, rpc_latency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
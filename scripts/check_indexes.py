@@ -0,0 +1,40 @@
+"""
+Verify that every hot Database query is served by an index.
+
+Usage:
+    python -m scripts.check_indexes [mongo_uri] [database_name]
+
+Point it at a local mongod (defaults to MONGO_URI / DATABASE_NAME from the
+environment). Indexes are created first, then explain() is run for each hot
+query; the script exits with status 1 if any of them is not an IXSCAN.
+"""
+import asyncio
+import sys
+
+import config
+from database import Database
+
+
+async def check() -> bool:
+    if len(sys.argv) > 1:
+        config.MONGO_URI = sys.argv[1]
+    if len(sys.argv) > 2:
+        config.DATABASE_NAME = sys.argv[2]
+
+    db = Database()
+    try:
+        await db.connect()
+        plans = await db.explain_hot_queries()
+    finally:
+        await db.close()
+
+    ok = True
+    for name, stages in plans.items():
+        indexed = any("IXSCAN" in stage for stage in stages) and "COLLSCAN" not in stages
+        print(f"{'OK  ' if indexed else 'FAIL'} {name}: {' <- '.join(stages)}")
+        ok = ok and indexed
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(check()) else 1)
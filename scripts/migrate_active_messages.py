@@ -0,0 +1,35 @@
+"""
+Move the active_messages arrays kept on file documents by older releases
+into the deliveries collection.
+
+Usage:
+    python -m scripts.migrate_active_messages [mongo_uri] [database_name]
+
+Defaults to MONGO_URI / DATABASE_NAME from the environment. Safe to run
+while the bot is up and to re-run: messages are copied before the array
+is unset, and copies of records that already exist are no-ops.
+"""
+import asyncio
+import sys
+
+import config
+from database import Database
+
+
+async def migrate():
+    if len(sys.argv) > 1:
+        config.MONGO_URI = sys.argv[1]
+    if len(sys.argv) > 2:
+        config.DATABASE_NAME = sys.argv[2]
+
+    db = Database()
+    try:
+        await db.connect()
+        return await db.migrate_active_messages()
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    files, messages = asyncio.run(migrate())
+    print(f"Moved {messages} delivered messages out of {files} files")
@@ -0,0 +1,49 @@
+"""
+Local stand-in for the ModijiURL API, for trying /short without an API key.
+
+Usage:
+    python -m scripts.stub_shortener [port] [latency_ms] [failure_rate]
+
+Then start the bot with SHORTENER_API_URL=http://127.0.0.1:<port>/api.
+Every request waits `latency_ms` and fails with a 503 at `failure_rate`
+(0-1), which exercises the client's timeouts and retries. Request counts
+are served at /stats.
+"""
+import asyncio
+import random
+import sys
+
+from aiohttp import web
+
+
+def build_app(latency: float, failure_rate: float) -> web.Application:
+    routes = web.RouteTableDef()
+    state = {"requests": 0, "failures": 0, "urls": {}}
+
+    @routes.get("/api")
+    async def shorten(request):
+        state["requests"] += 1
+        await asyncio.sleep(latency)
+        if random.random() < failure_rate:
+            state["failures"] += 1
+            return web.json_response({"status": "error", "message": "unavailable"}, status=503)
+        url = request.query.get("url")
+        if not request.query.get("api") or not url:
+            return web.json_response({"status": "error", "message": "api and url are required"})
+        code = state["urls"].setdefault(url, format(len(state["urls"]) + 1, "x"))
+        return web.json_response({"status": "success", "shortenedUrl": f"{request.url.origin()}/s/{code}"})
+
+    @routes.get("/stats")
+    async def stats(request):
+        return web.json_response({key: state[key] for key in ("requests", "failures")})
+
+    app = web.Application()
+    app.add_routes(routes)
+    return app
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8081
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    failure_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    web.run_app(build_app(latency, failure_rate), host="127.0.0.1", port=port)
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+from uuid import uuid4
+
+from pyrogram.errors import FloodWait, InputUserDeactivated, PeerIdInvalid, UserIsBlocked
+
+import config
+from utils.outbound import set_lane
+from utils.rate_limiter import TokenBucket
+
+# Send errors meaning the user can never be reached again, and how they are recorded
+UNREACHABLE_ERRORS = (
+    (UserIsBlocked, "blocked"),
+    (InputUserDeactivated, "deactivated"),
+    (PeerIdInvalid, "peer_invalid"),
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseLost(Exception):
+    """Another process took the broadcast over after this one stopped renewing its heartbeat."""
+
+
+class BroadcastManager:
+    """
+    Runs broadcasts as resumable background jobs.
+
+    Users are streamed from a cursor in user_id order and sent in chunks by
+    `workers` concurrent senders that share one token bucket sized to
+    Telegram's global limit. After every chunk the last user_id is stored
+    in the broadcasts collection, so a job interrupted by a restart picks
+    up where it stopped. Users who blocked the bot or were deleted are
+    marked unreachable and skipped by later broadcasts.
+
+    A job is run by the process holding its lease: the owner renews a
+    heartbeat with every chunk, and other processes only claim a running
+    job once that heartbeat is older than `lease_timeout`.
+    """
+
+    def __init__(self, client, workers: int = None, rate: float = None, chunk_size: int = None,
+                 progress_interval: float = None, max_retries: int = None, lease_timeout: float = None):
+        self.client = client
+        self.workers = workers or config.BROADCAST_WORKERS
+        self.bucket = TokenBucket(rate or config.BROADCAST_RATE)
+        self.chunk_size = chunk_size or config.BROADCAST_CHUNK_SIZE
+        self.progress_interval = progress_interval or config.BROADCAST_PROGRESS_INTERVAL
+        self.max_retries = max_retries if max_retries is not None else config.BROADCAST_MAX_RETRIES
+        self.lease_timeout = lease_timeout or config.BROADCAST_LEASE_TIMEOUT
+        self.owner = uuid4().hex
+        self._tasks: Dict[Any, asyncio.Task] = {}
+
+    @property
+    def db(self):
+        return self.client.db
+
+    @property
+    def running(self) -> int:
+        return len(self._tasks)
+
+    async def start(self, from_chat_id: int, message_id: int, status_message) -> Dict[str, Any]:
+        job = await self.db.create_broadcast({
+            "from_chat_id": from_chat_id,
+            "message_id": message_id,
+            "status_chat_id": status_message.chat.id,
+            "status_message_id": status_message.id,
+            "status": "running",
+            "owner": self.owner,
+            "heartbeat": datetime.utcnow(),
+            "last_user_id": None,
+            "sent_ids": [],
+            "success": 0,
+            "failed": 0,
+            "unreachable": 0,
+            "total": await self.db.count_reachable_users(),
+            "started_at": datetime.utcnow(),
+        })
+        self._spawn(job)
+        return job
+
+    async def resume(self) -> None:
+        """Claim and run the running broadcasts whose owner has stopped or died."""
+        stale_heartbeat = datetime.utcnow() - timedelta(seconds=self.lease_timeout)
+        for job in await self.db.get_running_broadcasts():
+            if job["_id"] in self._tasks:
+                continue
+            job = await self.db.claim_broadcast(job["_id"], self.owner, stale_heartbeat)
+            if job:
+                logger.info(f"Resuming broadcast {job['_id']} after user {job['last_user_id']}")
+                self._spawn(job)
+
+    async def resume_periodically(self) -> None:
+        while True:
+            try:
+                await self.resume()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Broadcast resume error: {str(e)}")
+            await asyncio.sleep(self.lease_timeout)
+
+    async def stop(self) -> None:
+        # Jobs stay "running" in the database and are resumed on next start;
+        # the lease is released so that needn't wait for it to expire
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def _spawn(self, job: Dict[str, Any]) -> None:
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job["_id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job["_id"], None))
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        set_lane("broadcast")
+        last_progress = 0.0
+        # Users of an interrupted chunk who already got the message
+        skip = set(job.get("sent_ids") or [])
+        try:
+            chunk: List[int] = []
+            async for user in self.db.iter_users(job["last_user_id"], self.chunk_size):
+                if user["user_id"] in skip:
+                    continue
+                chunk.append(user["user_id"])
+                if len(chunk) < self.chunk_size:
+                    continue
+                await self._send_chunk(job, chunk)
+                chunk = []
+                if time.monotonic() - last_progress >= self.progress_interval:
+                    last_progress = time.monotonic()
+                    await self._edit_status(job, "🔄 **Broadcasting...**")
+            if chunk:
+                await self._send_chunk(job, chunk)
+
+            job["status"] = "completed"
+            await self._save(job, {"status": "completed", "finished_at": datetime.utcnow()})
+            await self._edit_status(job, "✅ **Broadcast Completed**")
+        except asyncio.CancelledError:
+            await self.db.update_broadcast(job["_id"], {"owner": None}, owner=self.owner)
+            raise
+        except LeaseLost:
+            logger.warning(f"Broadcast {job['_id']} was taken over by another process")
+        except Exception as e:
+            logger.error(f"Broadcast Error ({job['_id']}): {str(e)}")
+            await self.db.update_broadcast(job["_id"], {"status": "failed", "error": str(e)}, owner=self.owner)
+            await self._edit_status(job, f"❌ **Broadcast Stopped:** `{str(e)}`")
+
+    async def _save(self, job: Dict[str, Any], fields: Dict[str, Any]) -> None:
+        if not await self.db.update_broadcast(job["_id"], fields, owner=self.owner):
+            raise LeaseLost(job["_id"])
+
+    async def _send_chunk(self, job: Dict[str, Any], user_ids: List[int]) -> None:
+        semaphore = asyncio.Semaphore(self.workers)
+        outcomes: Dict[int, str] = {}
+
+        async def send(user_id: int) -> None:
+            async with semaphore:
+                outcomes[user_id] = await self._send(job, user_id)
+
+        try:
+            await asyncio.gather(*(send(user_id) for user_id in user_ids))
+        except asyncio.CancelledError:
+            # Stopped mid-chunk: remember who was already sent to, so a resume
+            # continues from the same cursor without messaging them again
+            await self._record(job, outcomes, None)
+            raise
+        await self._record(job, outcomes, user_ids[-1])
+
+    async def _record(self, job: Dict[str, Any], outcomes: Dict[int, str], last_user_id) -> None:
+        """Store the outcomes of a chunk; `last_user_id` None means the chunk was interrupted."""
+        unreachable = {
+            user_id: outcome
+            for user_id, outcome in outcomes.items()
+            if outcome not in ("success", "failed")
+        }
+        await self.db.mark_unreachable_users(unreachable)
+
+        success = sum(1 for outcome in outcomes.values() if outcome == "success")
+        job["success"] += success
+        job["failed"] += len(outcomes) - success
+        job["unreachable"] = job.get("unreachable", 0) + len(unreachable)
+        if last_user_id is None:
+            job["sent_ids"] = (job.get("sent_ids") or []) + list(outcomes)
+        else:
+            job["last_user_id"] = last_user_id
+            job["sent_ids"] = []
+        await self._save(job, {
+            "last_user_id": job["last_user_id"],
+            "sent_ids": job["sent_ids"],
+            "success": job["success"],
+            "failed": job["failed"],
+            "unreachable": job["unreachable"],
+        })
+
+    async def _send(self, job: Dict[str, Any], user_id: int) -> str:
+        """Send the broadcast to one user; returns "success", "failed" or an unreachable reason."""
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                await self.client.copy_message(
+                    chat_id=user_id,
+                    from_chat_id=job["from_chat_id"],
+                    message_id=job["message_id"]
+                )
+                return "success"
+            except FloodWait as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    return "failed"
+                # A FloodWait applies to the whole bot, so every worker backs off
+                self.bucket.pause(e.value)
+            except Exception as e:
+                for error, reason in UNREACHABLE_ERRORS:
+                    if isinstance(e, error):
+                        return reason
+                return "failed"
+
+    async def _edit_status(self, job: Dict[str, Any], title: str) -> None:
+        done = job["success"] + job["failed"]
+        try:
+            await self.client.edit_message_text(
+                job["status_chat_id"],
+                job["status_message_id"],
+                f"{title}\n\n"
+                f"✓ Success: {job['success']}\n"
+                f"× Failed: {job['failed']} ({job.get('unreachable', 0)} blocked or deleted)\n"
+                f"📊 Total: {done}/{max(done, job.get('total', 0))}"
+            )
+        except Exception:
+            pass
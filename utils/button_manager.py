@@ -2,7 +2,6 @@ from typing import List, Union
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 import config
 import logging
-from pyrogram.errors import UserNotParticipant, BadRequest
 from datetime import datetime
 
 class ButtonManager:
@@ -28,23 +27,8 @@ class ButtonManager:
     async def check_force_sub(self, client, user_id: int) -> bool:
         if not self.channel_configs:
             return True
-
-        for channel_id, _ in self.channel_configs:
-            try:
-                member = await client.get_chat_member(int(channel_id), user_id)
-                if member.status not in ["member", "administrator", "creator"]:
-                    return False
-            except UserNotParticipant:
-                return False
-            except BadRequest as e:
-                if "user not found" in str(e).lower():
-                    return False
-                logging.error(f"Channel check error: {str(e)}")
-                continue
-            except Exception as e:
-                logging.error(f"Unexpected error: {str(e)}")
-                continue
-        return True
+        channels = [int(channel_id) for channel_id, _ in self.channel_configs]
+        return await client.force_sub.check(client, user_id, channels)
 
     def force_sub_button(self, file_id=None) -> InlineKeyboardMarkup:
         buttons = []
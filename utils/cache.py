@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries each carry their own time-to-live.
+    Bounded by entry count and, when `sizeof` is given, by the total size
+    in bytes that `sizeof` reports for the cached values.
+    Keeps hit/miss/eviction counters for the metrics and /stats output.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = None, sizeof: Callable[[Any], int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.size = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[1] > time.monotonic()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        value, expires_at, _ = item
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        if key in self._data:
+            self._remove(key)
+        size = self.sizeof(value) if self.sizeof else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        self._data[key] = (value, time.monotonic() + ttl, size)
+        self.size += size
+        self._evict()
+
+    def invalidate(self, key: Hashable) -> None:
+        if key in self._data:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.size = 0
+
+    def _remove(self, key: Hashable) -> None:
+        self.size -= self._data.pop(key)[2]
+
+    def _evict(self) -> None:
+        while len(self._data) > self.max_entries or (self.max_bytes and self.size > self.max_bytes):
+            _, (_, _, size) = self._data.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
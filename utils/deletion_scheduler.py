@@ -0,0 +1,269 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Set, Tuple
+from uuid import uuid4
+
+from pyrogram.errors import FloodWait
+
+import config
+from utils.outbound import set_lane
+from utils.rate_limiter import TokenBucket
+
+# Telegram accepts at most 100 message ids per delete_messages call
+MAX_DELETE_IDS = 100
+
+DELETION_NOTICE = (
+    "🚫 **File Deleted Due to Copyright Protection**\n\n"
+    "The file you received has been automatically deleted as part of our copyright protection measures.\n\n"
+    "• If you need the file again, you can request it using the same link\n"
+    "• Save important files to your saved messages before they're deleted\n"
+    "• This helps us maintain a fair and legal file-sharing environment"
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DeletionScheduler:
+    """
+    Restart-safe auto-delete scheduler.
+
+    Every pending deletion lives in the deletion_queue collection. A single
+    worker keeps the deletions due within the next `window` seconds in a
+    min-heap, sleeps until the earliest one, claims it in Mongo and runs it.
+    A restart simply reloads the queue, so nothing is lost on redeploy.
+    Entries are only removed once their chat's messages are deleted; a
+    failed chat is released and retried later with exponential backoff.
+    """
+
+    def __init__(self, client, window: float = None, load_limit: int = None, claim_timeout: float = None):
+        self.client = client
+        self.window = window or config.DELETION_WINDOW
+        self.load_limit = load_limit or config.DELETION_LOAD_LIMIT
+        self.claim_timeout = claim_timeout or config.DELETION_CLAIM_TIMEOUT
+        self.retry_delay = config.DELETION_RETRY_DELAY
+        self.max_attempts = config.DELETION_MAX_ATTEMPTS
+        self.owner = uuid4().hex
+        self.executor = DeletionExecutor(client)
+        self._heap: List[Tuple[float, str, Dict[str, Any]]] = []
+        self._known: Set[str] = set()
+        self._horizon = 0.0
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.executed = 0
+        self.failed = 0
+        self.abandoned = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+
+    @property
+    def db(self):
+        return self.client.db
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def schedule(self, file_uuid: str, chat_id: int, message_ids: List[int], delete_time: int) -> None:
+        due_at = datetime.utcnow() + timedelta(minutes=delete_time)
+        entry = await self.db.enqueue_deletion(file_uuid, chat_id, message_ids, due_at)
+        if self._due_ts(entry) <= self._horizon:
+            self._push(entry)
+            self._wakeup.set()
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": await self.db.count_pending_deletions(),
+            "loaded": len(self._heap),
+            "executed": self.executed,
+            "failed": self.failed,
+            "abandoned": self.abandoned,
+            "last_lateness": self.last_lateness,
+            "max_lateness": self.max_lateness,
+            "flood_waits": self.executor.flood_waits,
+        }
+
+    @staticmethod
+    def _due_ts(entry: Dict[str, Any]) -> float:
+        # due_at is a naive UTC datetime as stored by pymongo
+        return (entry["due_at"] - datetime(1970, 1, 1)).total_seconds()
+
+    def _push(self, entry: Dict[str, Any]) -> None:
+        key = str(entry["_id"])
+        if key not in self._known:
+            self._known.add(key)
+            heapq.heappush(self._heap, (self._due_ts(entry), key, entry))
+
+    def _stale_claim(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.claim_timeout)
+
+    async def _load(self) -> None:
+        now = time.time()
+        horizon = datetime.utcfromtimestamp(now + self.window)
+        entries = await self.db.get_due_deletions(horizon, self._stale_claim(), self.load_limit)
+        for entry in entries:
+            self._push(entry)
+        # If the window was truncated by the limit, only trust what we loaded
+        if len(entries) >= self.load_limit:
+            self._horizon = self._due_ts(entries[-1])
+        else:
+            self._horizon = now + self.window
+
+    async def _run(self) -> None:
+        set_lane("deletion")
+        while True:
+            try:
+                if time.time() >= self._horizon - self.window / 2:
+                    await self._load()
+
+                now = time.time()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    _, key, entry = heapq.heappop(self._heap)
+                    self._known.discard(key)
+                    due.append(entry)
+                if due:
+                    await self._execute(due, now)
+                    continue
+
+                next_due = self._heap[0][0] if self._heap else self._horizon
+                timeout = max(0.0, min(next_due, self._horizon - self.window / 2) - now)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in auto-delete scheduler: {str(e)}")
+                await asyncio.sleep(5)
+
+    async def _execute(self, entries: List[Dict[str, Any]], now: float) -> None:
+        claimed = set(await self.db.claim_deletions([entry["_id"] for entry in entries], self.owner, self._stale_claim()))
+        entries = [entry for entry in entries if entry["_id"] in claimed]
+        if not entries:
+            return
+        for entry in entries:
+            lateness = max(0.0, now - self._due_ts(entry))
+            self.last_lateness = lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+
+        executed, failed = await self.executor.run(entries)
+        self.executed += executed
+        self.failed += len({entry["chat_id"] for entry in failed})
+        failed_ids = {entry["_id"] for entry in failed}
+        done = [entry["_id"] for entry in entries if entry["_id"] not in failed_ids]
+        if done:
+            await self.db.remove_deletions(done)
+        if failed:
+            await self._retry(failed)
+
+    async def _retry(self, entries: List[Dict[str, Any]]) -> None:
+        """Release failed entries with a later due_at, or drop them once out of attempts."""
+        retries, abandoned = [], []
+        for entry in entries:
+            attempts = entry.get("attempts", 0) + 1
+            if attempts >= self.max_attempts:
+                logger.error(
+                    f"Giving up on auto-delete of {entry['uuid']} in chat {entry['chat_id']} after {attempts} attempts"
+                )
+                abandoned.append(entry["_id"])
+                continue
+            entry["attempts"] = attempts
+            entry["due_at"] = datetime.utcnow() + timedelta(seconds=self.retry_delay * 2 ** (attempts - 1))
+            retries.append(entry)
+
+        if abandoned:
+            self.abandoned += len(abandoned)
+            await self.db.remove_deletions(abandoned)
+        if retries:
+            await self.db.release_deletions(retries, self.owner)
+            for entry in retries:
+                if self._due_ts(entry) <= self._horizon:
+                    self._push(entry)
+
+
+class DeletionExecutor:
+    """
+    Runs a set of due deletions with as few Telegram and Mongo calls as
+    possible: message ids are grouped per chat into delete_messages calls
+    of up to 100 ids, every call goes through a global token bucket, each
+    chat gets one deletion notice, and the delivery records are removed
+    with a single bulk write.
+    """
+
+    def __init__(self, client, rate: float = None, max_retries: int = None, concurrency: int = None):
+        self.client = client
+        self.bucket = TokenBucket(rate or config.DELETION_RATE)
+        self.max_retries = max_retries if max_retries is not None else config.DELETION_MAX_RETRIES
+        self._semaphore = asyncio.Semaphore(concurrency or config.DELETION_CONCURRENCY)
+        self.flood_waits = 0
+
+    async def run(self, entries: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+        """Execute `entries` and return (deleted chats, entries of the chats that failed)."""
+        by_chat: Dict[int, List[Dict[str, Any]]] = {}
+        for entry in entries:
+            by_chat.setdefault(entry["chat_id"], []).append(entry)
+
+        results = await asyncio.gather(
+            *(self._run_chat(chat_id, chat_entries) for chat_id, chat_entries in by_chat.items())
+        )
+
+        removed = [
+            (entry["uuid"], entry["chat_id"], msg_id)
+            for ok, chat_entries in zip(results, by_chat.values())
+            if ok
+            for entry in chat_entries
+            for msg_id in entry["message_ids"]
+        ]
+        try:
+            await self.client.db.remove_file_messages(removed)
+        except Exception as e:
+            logger.error(f"Error in auto-delete cleanup: {str(e)}")
+
+        failed = [
+            entry
+            for ok, chat_entries in zip(results, by_chat.values())
+            if not ok
+            for entry in chat_entries
+        ]
+        return sum(1 for ok in results if ok), failed
+
+    async def _run_chat(self, chat_id: int, entries: List[Dict[str, Any]]) -> bool:
+        message_ids = [msg_id for entry in entries for msg_id in entry["message_ids"]]
+        async with self._semaphore:
+            try:
+                for i in range(0, len(message_ids), MAX_DELETE_IDS):
+                    await self._call(self.client.delete_messages, chat_id, message_ids[i:i + MAX_DELETE_IDS])
+            except Exception as e:
+                logger.error(f"Error in auto-delete: {str(e)}")
+                return False
+            # The messages are gone either way; a lost notice isn't worth a retry
+            try:
+                await self._call(self.client.send_message, chat_id=chat_id, text=DELETION_NOTICE)
+            except Exception as e:
+                logger.warning(f"Auto-delete notice failed for chat {chat_id}: {str(e)}")
+            return True
+
+    async def _call(self, method, *args, **kwargs):
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                return await method(*args, **kwargs)
+            except FloodWait as e:
+                attempt += 1
+                self.flood_waits += 1
+                if attempt > self.max_retries:
+                    raise
+                # Telegram's flood limits are account-wide, so hold back every deletion
+                self.bucket.pause(e.value * attempt)
@@ -0,0 +1,78 @@
+from typing import List
+
+from pyrogram import enums, raw
+from pyrogram.errors import FileReferenceExpired, FileReferenceInvalid, MediaEmpty
+
+import config
+
+# Telegram accepts at most 100 message ids per forward call
+MAX_COPY_IDS = 100
+
+# The stored file_id can no longer be used and the file must be copied again
+STALE_FILE_ID_ERRORS = (FileReferenceExpired, FileReferenceInvalid, MediaEmpty)
+
+
+async def send_file(client, chat_id: int, file_data: dict, protect_content: bool = False):
+    """
+    Deliver a stored file to `chat_id`.
+
+    In "cached" mode the file is re-sent from its stored file_id, which does
+    not need to read the DB channel. Files without a stored caption (uploaded
+    before captions were kept) and stale file_ids fall back to copying the
+    DB channel message; in the latter case the file_id is refreshed from the
+    copy.
+    """
+    if config.DELIVERY_MODE == "cached" and file_data.get("file_id") and "caption" in file_data:
+        try:
+            return await client.send_cached_media(
+                chat_id=chat_id,
+                file_id=file_data["file_id"],
+                caption=file_data["caption"],
+                parse_mode=enums.ParseMode.HTML,
+                protect_content=protect_content
+            )
+        except STALE_FILE_ID_ERRORS:
+            msg = await copy_file(client, chat_id, file_data, protect_content)
+            media = getattr(msg, file_data.get("file_type") or "", None)
+            if media and getattr(media, "file_id", None):
+                await client.db.update_file_id(file_data["uuid"], media.file_id)
+            return msg
+
+    return await copy_file(client, chat_id, file_data, protect_content)
+
+
+async def copy_file(client, chat_id: int, file_data: dict, protect_content: bool = False):
+    return await client.copy_message(
+        chat_id=chat_id,
+        from_chat_id=config.DB_CHANNEL_ID,
+        message_id=file_data["message_id"],
+        protect_content=protect_content
+    )
+
+
+async def copy_messages(client, chat_id: int, from_chat_id: int, message_ids: List[int],
+                        protect_content: bool = False) -> List[int]:
+    """
+    Copy several messages in a single request, like copy_message for many
+    ids at once: messages.ForwardMessages with drop_author hides the source
+    channel, and albums stay grouped. Returns the new message ids in the
+    order of `message_ids` (0 where Telegram did not send one).
+    """
+    random_ids = [client.rnd_id() for _ in message_ids]
+    result = await client.invoke(
+        raw.functions.messages.ForwardMessages(
+            from_peer=await client.resolve_peer(from_chat_id),
+            id=message_ids,
+            random_id=random_ids,
+            to_peer=await client.resolve_peer(chat_id),
+            drop_author=True,
+            noforwards=protect_content,
+        )
+    )
+    sent = {
+        update.random_id: update.id
+        for update in getattr(result, "updates", [])
+        if isinstance(update, raw.types.UpdateMessageID)
+    }
+    return [sent.get(random_id, 0) for random_id in random_ids]
+
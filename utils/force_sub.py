@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from typing import Iterable, Optional
+
+from pyrogram.errors import BadRequest, UserNotParticipant
+
+import config
+from utils.cache import TTLCache
+
+MEMBER_STATUSES = {"member", "administrator", "creator", "owner"}
+
+
+class ForceSubChecker:
+    """
+    Checks force-subscribe membership for all configured channels at once
+    and caches the answers: positive results for `positive_ttl` seconds,
+    negative ones only for `negative_ttl` so a user who just joined is let
+    in quickly. Entries are dropped when a chat_member update arrives.
+    """
+
+    def __init__(self, positive_ttl: float = None, negative_ttl: float = None, max_entries: int = None):
+        self.positive_ttl = positive_ttl or config.FSUB_CACHE_POSITIVE_TTL
+        self.negative_ttl = negative_ttl or config.FSUB_CACHE_NEGATIVE_TTL
+        self.cache = TTLCache(max_entries or config.FSUB_CACHE_SIZE)
+
+    async def check(self, client, user_id: int, channels: Iterable[int] = None) -> bool:
+        channels = list(config.FORCE_SUB_CHANNELS if channels is None else channels)
+        if not channels:
+            return True
+        results = await asyncio.gather(*(self.is_member(client, channel_id, user_id) for channel_id in channels))
+        return all(result is not False for result in results)
+
+    async def is_member(self, client, channel_id: int, user_id: int) -> Optional[bool]:
+        """True/False for a definite answer, None when Telegram could not tell us."""
+        key = (channel_id, user_id)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            member = await client.get_chat_member(channel_id, user_id)
+            is_member = getattr(member.status, "value", member.status) in MEMBER_STATUSES
+        except UserNotParticipant:
+            is_member = False
+        except BadRequest as e:
+            if "user not found" not in str(e).lower():
+                logging.error(f"Channel check error: {str(e)}")
+                return None
+            is_member = False
+        except Exception as e:
+            logging.error(f"Unexpected error: {str(e)}")
+            return None
+
+        self.cache.set(key, is_member, self.positive_ttl if is_member else self.negative_ttl)
+        return is_member
+
+    def invalidate(self, channel_id: int, user_id: int) -> None:
+        self.cache.invalidate((channel_id, user_id))
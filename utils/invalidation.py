@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Updates to other file fields (download counters) don't affect cached metadata
+FILE_CACHE_FIELDS = ("uuid", "code", "file_id", "file_name", "message_id", "caption", "auto_delete", "auto_delete_time")
+
+# "$changeStream is only supported on replica sets"
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+WATCHED_COLLECTIONS = ("files", "batches", "settings")
+
+
+class CacheInvalidator:
+    """
+    Keeps this process' caches in line with writes made by other replicas.
+
+    Uses a change stream on files, batches and settings where the server
+    supports it. On a standalone mongod it falls back to polling the
+    invalidations collection, which every replica then writes to.
+    """
+
+    def __init__(self, client, poll_interval: float = None):
+        self.client = client
+        self.poll_interval = poll_interval or config.INVALIDATION_POLL_INTERVAL
+        self.mode = None
+        self._task = None
+
+    @property
+    def db(self):
+        return self.client.db
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self.mode == "polling":
+                    await self._poll()
+                else:
+                    await self._watch()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code != CHANGE_STREAMS_UNSUPPORTED:
+                    logger.error(f"Cache invalidation error: {str(e)}")
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                logger.warning("Change streams unavailable, polling for cache invalidations")
+                self.mode = "polling"
+                self.db.log_invalidations = True
+                self.db.clear_cached()
+            except PyMongoError as e:
+                logger.error(f"Cache invalidation error: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _watch(self) -> None:
+        pipeline = [
+            {
+                "$match": {
+                    "ns.coll": {"$in": list(WATCHED_COLLECTIONS)},
+                    "$or": [
+                        {"operationType": {"$ne": "update"}},
+                        {"ns.coll": {"$ne": "files"}},
+                        *[
+                            {f"updateDescription.updatedFields.{field}": {"$exists": True}}
+                            for field in FILE_CACHE_FIELDS
+                        ],
+                    ],
+                }
+            }
+        ]
+        async with self.db.db.watch(pipeline) as stream:
+            self.mode = "change_stream"
+            # Anything cached before the stream opened may already be stale
+            self.db.clear_cached()
+            await self.client.settings.reload()
+            async for change in stream:
+                await self._apply_change(change)
+
+    async def _apply_change(self, change: Dict[str, Any]) -> None:
+        collection = change.get("ns", {}).get("coll")
+        document = change.get("fullDocument") or {}
+        object_id = change.get("documentKey", {}).get("_id")
+
+        if collection == "settings":
+            await self.client.settings.reload()
+        elif change["operationType"] not in ("insert", "update", "replace", "delete"):
+            # drop, rename, invalidate...: start from scratch
+            self.db.clear_cached()
+        elif collection == "files":
+            self.db.drop_cached_id(object_id)
+            if "uuid" in document:
+                self.db.drop_cached("file", document["uuid"])
+        elif collection == "batches":
+            self.db.drop_cached_id(object_id)
+            if "batch_id" in document:
+                self.db.drop_cached("batch", document["batch_id"])
+
+    async def _poll(self) -> None:
+        since = datetime.utcnow()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            now = datetime.utcnow()
+            # Overlap the previous window so entries from slightly skewed clocks aren't missed
+            events = await self.db.get_invalidations(since - timedelta(seconds=self.poll_interval))
+            since = now
+            reload = False
+            for event in events:
+                if event["kind"] == "setting":
+                    reload = True
+                else:
+                    self.db.drop_cached(event["kind"], event["key"])
+            if reload:
+                await self.client.settings.reload()
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Audit events that block the calling thread (see the table of Python audit events)
+BLOCKING_AUDIT_EVENTS = {"time.sleep", "socket.connect", "open", "subprocess.Popen", "os.system"}
+
+
+def _percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop runs scheduled callbacks.
+
+    A task sleeps `interval` seconds at a time and records how much longer
+    than that the sleep took. A watchdog thread watches the task's
+    heartbeat; when the loop has not come back for `threshold` seconds it
+    prints the loop thread's stack and the task that was running, which is
+    the code blocking the loop, once per stall.
+
+    With `debug` on, asyncio's own slow-callback warnings are enabled and
+    blocking calls (time.sleep, blocking sockets, file opens, subprocesses)
+    made from inside a coroutine are printed with their call site.
+    """
+
+    def __init__(self, interval: float = None, threshold: float = None, debug: bool = None, samples: int = 1000):
+        self.interval = interval or config.LOOP_LAG_INTERVAL
+        self.threshold = threshold or config.LOOP_LAG_THRESHOLD
+        self.debug = config.LOOP_DEBUG if debug is None else debug
+        self.samples = deque(maxlen=samples)
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.blocking_calls = 0
+        self._heartbeat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._reported = set()
+        self._in_hook = False
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        if self.debug:
+            self._loop.set_debug(True)
+            self._loop.slow_callback_duration = self.threshold
+            # Audit hooks can't be removed; the hook checks self.debug on every call
+            sys.addaudithook(self._audit)
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        self.debug = False
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        samples = list(self.samples)
+        return {
+            "p50": _percentile(samples, 0.50),
+            "p99": _percentile(samples, 0.99),
+            "max": self.max_lag,
+            "stalls": self.stalls,
+            "blocking_calls": self.blocking_calls,
+        }
+
+    async def _sample(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            self._heartbeat = now
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def _watch(self) -> None:
+        stalled_since = None
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.threshold:
+                stalled_since = None
+            elif stalled_since != heartbeat:
+                stalled_since = heartbeat
+                self.stalls += 1
+                self._report_stall(blocked)
+
+    def _report_stall(self, blocked: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = "".join(traceback.format_stack(frame)) if frame else "<no frame>\n"
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        name = task.get_name() if task else "<no task>"
+        coro = getattr(task.get_coro(), "__qualname__", "?") if task else "?"
+        logger.warning(f"⚠️ Event loop blocked for {blocked:.2f}s in task {name} ({coro}):\n{stack}")
+
+    def _audit(self, event: str, args: tuple) -> None:
+        if not self.debug or event not in BLOCKING_AUDIT_EVENTS or self._in_hook:
+            return
+        if threading.get_ident() != self._loop_thread:
+            return
+        if event == "socket.connect" and not args[0].getblocking():
+            return
+        # Source files are read by traceback/linecache when formatting stacks
+        if event == "open" and (not isinstance(args[0], str) or args[0].startswith("/proc/") or args[0].endswith(".py")):
+            return
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            return
+        if task is None:
+            return
+        self._in_hook = True
+        try:
+            caller = traceback.extract_stack(limit=2)[0]
+            site = (event, caller.filename, caller.lineno)
+            self.blocking_calls += 1
+            if site not in self._reported:
+                self._reported.add(site)
+                logger.warning(
+                    f"⚠️ Blocking call {event} in coroutine {task.get_name()} at "
+                    f"{caller.filename}:{caller.lineno} ({caller.name})"
+                )
+        finally:
+            self._in_hook = False
@@ -0,0 +1,126 @@
+import inspect
+import logging
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cached Mongo read up to a slow batch delivery
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        if error:
+            self.errors += 1
+
+
+class Metrics:
+    """
+    In-process counters and latency histograms, rendered in the Prometheus
+    text format by the web server's /metrics route.
+
+    Recording is a dict lookup and a bisect, so instrumented code pays
+    almost nothing; everything else (cache, buffer and loop-lag figures) is
+    read from `collectors` only when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def observe(self, name: str, seconds: float, error: bool = False, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds, error)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        self.collectors.append(collector)
+
+    def timed(self, name: str, **labels: str):
+        """Decorator recording the duration and failures of an async function."""
+        def decorator(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                error = False
+                try:
+                    return await func(*args, **kwargs)
+                except BaseException:
+                    error = True
+                    raise
+                finally:
+                    self.observe(name, time.perf_counter() - started, error, **labels)
+            return wrapper
+        return decorator
+
+    def render(self) -> str:
+        lines = []
+        typed = set()
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            lines.append(f"{name}_errors_total{_labels(labels)} {histogram.errors}")
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for collector in self.collectors:
+            try:
+                for name, labels, value in collector():
+                    lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {float(value)}")
+            except Exception as e:
+                logger.error(f"Metrics collector error: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def instrument(cls, name: str, skip: Iterable[str] = (), span: str = None) -> None:
+    """
+    Time every public coroutine method of `cls` under the `name` histogram
+    and, if `span` is given, count it as that kind of time in update timings.
+    """
+    from utils.timing import timed_span
+
+    for attr, func in list(vars(cls).items()):
+        if attr.startswith("_") or attr in skip or not inspect.iscoroutinefunction(func):
+            continue
+        if span:
+            func = timed_span(span, attr)(func)
+        setattr(cls, attr, metrics.timed(name, method=attr)(func))
+
+
+metrics = Metrics()
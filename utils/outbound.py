@@ -0,0 +1,203 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, Optional
+
+from pyrogram.errors import FloodWait
+
+import config
+from utils.cache import TTLCache
+from utils.metrics import metrics
+from utils.rate_limiter import TokenBucket
+from utils.timing import span
+
+LANES = ("interactive", "admin", "batch", "broadcast", "deletion")
+
+# Lanes whose jobs fan out over many chats from several workers; their
+# FloodWaits go back to the job, which pauses all of its workers at once
+FAN_OUT_LANES = ("broadcast", "deletion")
+
+# Requests that send, edit or delete messages and so count against Telegram's
+# flood limits; reads (GetMessages, GetChatMember, ...) go straight through
+RATE_LIMITED = {
+    "functions.messages.SendMessage",
+    "functions.messages.SendMedia",
+    "functions.messages.SendMultiMedia",
+    "functions.messages.ForwardMessages",
+    "functions.messages.EditMessage",
+    "functions.messages.DeleteMessages",
+    "functions.channels.DeleteMessages",
+}
+
+_lane: ContextVar[str] = ContextVar("outbound_lane", default="interactive")
+
+
+@contextmanager
+def lane(name: str):
+    """Send the Telegram requests made inside the block through lane `name`."""
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def set_lane(name: str) -> None:
+    """Set the lane for the rest of the current task (for background jobs)."""
+    _lane.set(name)
+
+
+def lane_updates(callback):
+    """
+    Wrap a Pyrogram handler callback so updates from admins use the admin lane.
+    FileShareBot.add_handler applies it to every handler as it is registered.
+    """
+    @wraps(callback)
+    async def wrapper(client, update, *args):
+        if getattr(getattr(update, "from_user", None), "id", None) in config.ADMIN_IDS:
+            with lane("admin"):
+                return await callback(client, update, *args)
+        return await callback(client, update, *args)
+    return wrapper
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """Parse "interactive:100,batch:10" into lane weights; unknown lanes are ignored."""
+    weights = {}
+    for item in value.split(","):
+        name, _, weight = item.strip().partition(":")
+        if name in LANES and weight:
+            weights[name] = float(weight)
+    return weights
+
+
+def peer_key(query: Any) -> Optional[tuple]:
+    """The chat a raw request is sent to, or None if it doesn't name one."""
+    for field in ("peer", "to_peer", "channel"):
+        peer = getattr(query, field, None)
+        if peer is None:
+            continue
+        for attr in ("user_id", "chat_id", "channel_id"):
+            value = getattr(peer, attr, None)
+            if value is not None:
+                return attr, value
+        return type(peer).__name__, None
+    return None
+
+
+class OutboundScheduler:
+    """
+    Paces every rate-limited Telegram request the bot makes.
+
+    A request first waits for its chat's bucket (about one message per
+    second with a small burst), then for a token from the global bucket
+    (about 30 per second). Requests waiting on the global bucket queue in
+    their lane (interactive, admin, batch, broadcast, deletion) and lanes
+    share the tokens in proportion to their weights (weighted fair queueing),
+    so a single-file delivery only ever waits behind a handful of
+    background requests while no lane is starved outright. FloodWaits are
+    handled here instead of inside Pyrogram: the chat (or, for requests
+    without a chat, the whole bot) is paused for the requested time and
+    the request is retried. Broadcast and deletion requests are the
+    exception: their FloodWait is raised to the job, whose own bucket
+    holds back every worker rather than just the one chat.
+    """
+
+    def __init__(self, global_rate: float = None, chat_rate: float = None, chat_burst: float = None,
+                 max_retries: int = None, max_flood_wait: float = None, weights: Dict[str, float] = None):
+        self.global_bucket = TokenBucket(global_rate or config.OUTBOUND_GLOBAL_RATE)
+        self.chat_rate = chat_rate or config.OUTBOUND_CHAT_RATE
+        self.chat_burst = chat_burst or config.OUTBOUND_CHAT_BURST
+        self.max_retries = max_retries if max_retries is not None else config.OUTBOUND_MAX_RETRIES
+        self.max_flood_wait = max_flood_wait or config.OUTBOUND_MAX_FLOOD_WAIT
+        # A bucket idle for a minute is full again, so it can be dropped and recreated
+        self._chat_buckets = TTLCache(100000)
+        weights = weights or parse_weights(config.OUTBOUND_LANE_WEIGHTS)
+        self.weights = {name: weights.get(name, 1.0) for name in LANES}
+        self._queues = {name: deque() for name in LANES}
+        # Weighted fair queueing: each lane's pass advances by 1/weight per
+        # request and the lane whose next request would finish first (lowest
+        # pass + 1/weight) goes next; _virtual is the pass of the last request
+        # dispatched
+        self._passes = {name: 0.0 for name in LANES}
+        self._virtual = 0.0
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.flood_waits = 0
+
+    def _chat_bucket(self, key: tuple) -> TokenBucket:
+        bucket = self._chat_buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+        self._chat_buckets.set(key, bucket, 60)
+        return bucket
+
+    async def call(self, invoke, query, *args, **kwargs):
+        if getattr(query, "QUALNAME", None) not in RATE_LIMITED:
+            return await invoke(query, *args, **kwargs)
+
+        # FloodWaits must reach us rather than being slept through inside Pyrogram
+        kwargs.setdefault("sleep_threshold", 0)
+        key = peer_key(query)
+        lane_name = _lane.get() if _lane.get() in LANES else "interactive"
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            with span("telegram", "outbound.wait"):
+                if key is not None:
+                    await self._chat_bucket(key).acquire()
+                await self._acquire_global(lane_name)
+            metrics.observe("outbound_wait_seconds", time.perf_counter() - started, lane=lane_name)
+            try:
+                return await invoke(query, *args, **kwargs)
+            except FloodWait as e:
+                attempt += 1
+                self.flood_waits += 1
+                if lane_name in FAN_OUT_LANES:
+                    raise
+                if attempt > self.max_retries or e.value > self.max_flood_wait:
+                    raise
+                if key is not None:
+                    self._chat_bucket(key).pause(e.value)
+                else:
+                    self.global_bucket.pause(e.value)
+
+    def stats(self) -> Dict[str, int]:
+        """Requests queued for a global token, per lane."""
+        return {name: len(queue) for name, queue in self._queues.items()}
+
+    async def _acquire_global(self, lane_name: str) -> None:
+        if not any(self._queues.values()) and self.global_bucket.try_acquire():
+            return
+        queue = self._queues[lane_name]
+        if not queue:
+            # An idle lane rejoins at the current virtual time: next in line,
+            # but without credit banked while it had nothing to send
+            self._passes[lane_name] = max(self._passes[lane_name], self._virtual)
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await waiter
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        while True:
+            busy = [name for name, queue in self._queues.items() if queue]
+            if not busy:
+                return None
+            name = min(busy, key=lambda lane_name: self._passes[lane_name] + 1.0 / self.weights[lane_name])
+            waiter = self._queues[name].popleft()
+            # Requests cancelled while queued don't use up their lane's share
+            if not waiter.done():
+                self._virtual = self._passes[name]
+                self._passes[name] += 1.0 / self.weights[name]
+                return waiter
+
+    async def _dispatch(self) -> None:
+        while any(self._queues.values()):
+            await self.global_bucket.acquire()
+            waiter = self._next_waiter()
+            if waiter is not None:
+                waiter.set_result(None)
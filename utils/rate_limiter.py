@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+from utils.cache import TTLCache
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens per second, bursting up to `capacity`.
+    Waiters are served in arrival order. `pause()` stops the bucket for a
+    while, e.g. when Telegram answers with a FloodWait.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        now = time.monotonic()
+        if now < self._paused_until or self._lock.locked():
+            return False
+        self._refill(now)
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def set_rate(self, rate: float) -> None:
+        self._refill(time.monotonic())
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self._tokens = min(self._tokens, self.capacity)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class SlidingWindowLimiter:
+    """
+    Allows `limit` hits per key within any `window` seconds.
+
+    Uses the sliding window counter approximation: the count of the current
+    fixed window plus the previous window's count, weighted by how much of
+    the previous window still overlaps the sliding one. That is three
+    numbers per key, and idle keys simply age out of a bounded cache.
+    """
+
+    def __init__(self, limit: int, window: float, max_keys: int = 100000):
+        self.limit = limit
+        self.window = window
+        # key -> [window index, hits in that window, hits in the one before, notified]
+        self._keys = TTLCache(max_keys)
+
+    def _state(self, key, now: float) -> list:
+        index = int(now // self.window)
+        state = self._keys.get(key)
+        if state is None:
+            state = [index, 0, 0, False]
+        elif state[0] != index:
+            previous = state[1] if state[0] == index - 1 else 0
+            state = [index, 0, previous, False]
+        self._keys.set(key, state, self.window * 2)
+        return state
+
+    def count(self, current: float, previous: float, now: float) -> float:
+        overlap = 1 - (now % self.window) / self.window
+        return current + previous * overlap
+
+    def hit(self, key) -> bool:
+        """Record a hit for `key`; False (and not recorded) if it is over the limit."""
+        now = time.time()
+        state = self._state(key, now)
+        if self.count(state[1], state[2], now) >= self.limit:
+            return False
+        state[1] += 1
+        return True
+
+    def first_rejection(self, key) -> bool:
+        """True the first time this is asked for `key` in the current window."""
+        state = self._state(key, time.time())
+        if state[3]:
+            return False
+        state[3] = True
+        return True
+
+    def retry_after(self) -> float:
+        return self.window - time.time() % self.window
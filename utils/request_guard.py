@@ -0,0 +1,73 @@
+import logging
+from typing import Optional
+
+import config
+from utils.metrics import metrics
+from utils.rate_limiter import SlidingWindowLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class RequestGuard:
+    """
+    Sheds abusive /start and download traffic before it costs any Mongo or
+    Telegram work.
+
+    Each request counts against the user's and the file's sliding window.
+    The in-memory check runs first, so rejections are free; with
+    RATE_LIMIT_SHARED on, requests that pass it are also counted in Mongo
+    so the limits hold across all replicas. Admins are never limited.
+    """
+
+    def __init__(self, client, shared: bool = None):
+        self.client = client
+        self.shared = config.RATE_LIMIT_SHARED if shared is None else shared
+        self.users = SlidingWindowLimiter(config.USER_RATE_LIMIT, config.USER_RATE_WINDOW)
+        self.files = SlidingWindowLimiter(config.FILE_RATE_LIMIT, config.FILE_RATE_WINDOW)
+        self.shed = 0
+
+    async def check(self, handler: str, user_id: int, file_key: str = None) -> Optional[str]:
+        """None if the request may proceed, otherwise what it was limited on ("user" or "file")."""
+        if user_id in config.ADMIN_IDS:
+            return None
+
+        reason = None
+        if not self.users.hit(user_id):
+            reason = "user"
+        elif file_key and not self.files.hit(file_key):
+            reason = "file"
+        elif self.shared:
+            reason = await self._check_shared(user_id, file_key)
+
+        if reason:
+            self.shed += 1
+            metrics.inc("requests_shed_total", handler=handler, reason=reason)
+        return reason
+
+    async def _check_shared(self, user_id: int, file_key: Optional[str]) -> Optional[str]:
+        try:
+            if await self.client.db.count_request(f"user:{user_id}", self.users.window) > self.users.limit:
+                return "user"
+            if file_key and await self.client.db.count_request(f"file:{file_key}", self.files.window) > self.files.limit:
+                return "file"
+        except Exception as e:
+            # Fail open: the local limits still apply
+            logger.error(f"Shared rate limit error: {str(e)}")
+        return None
+
+    def _limiter(self, reason: str) -> SlidingWindowLimiter:
+        return self.files if reason == "file" else self.users
+
+    def should_notify(self, reason: str, user_id: int, file_key: str = None) -> bool:
+        """
+        Only the first rejection per window gets a reply, so a flood doesn't
+        turn into outgoing messages. The window is that of the limiter that
+        rejected the request; a hot file still answers each user once.
+        """
+        if reason == "file":
+            return self.files.first_rejection((file_key, user_id))
+        return self.users.first_rejection(user_id)
+
+    def retry_after(self, reason: str) -> float:
+        """Seconds until the window that rejected the request (check()'s `reason`) rolls over."""
+        return self._limiter(reason).retry_after()
@@ -0,0 +1,100 @@
+import logging
+from typing import Any, Callable, Dict, List
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        if value.lower() in ("on", "true", "yes", "1"):
+            return True
+        if value.lower() in ("off", "false", "no", "0"):
+            return False
+        raise ValueError(f"expected on/off, got {value!r}")
+    return bool(value)
+
+
+def _bounded(kind: Callable[[Any], Any], low: float, high: float) -> Callable[[Any], Any]:
+    def parse(value: Any) -> Any:
+        value = kind(value)
+        if not low <= value <= high:
+            raise ValueError(f"must be between {low} and {high}")
+        return value
+    return parse
+
+
+# Runtime tunables: name -> (parser/validator, default from the environment, description)
+SETTINGS = {
+    "auto_delete_time": (_bounded(int, 1, 10080), lambda: config.DEFAULT_AUTO_DELETE,
+                         "Auto-delete time for new uploads (minutes)"),
+    "privacy_mode": (_parse_bool, lambda: config.PRIVACY_MODE,
+                     "Protect delivered files from forwarding and saving"),
+    "broadcast_rate": (_bounded(float, 0.1, 30), lambda: config.BROADCAST_RATE,
+                       "Broadcast messages per second"),
+    "deletion_rate": (_bounded(float, 0.1, 30), lambda: config.DELETION_RATE,
+                      "Auto-delete requests per second"),
+    "user_rate_limit": (_bounded(int, 1, 1000), lambda: config.USER_RATE_LIMIT,
+                        "/start and download requests per user per USER_RATE_WINDOW"),
+    "file_rate_limit": (_bounded(int, 1, 100000), lambda: config.FILE_RATE_LIMIT,
+                        "/start and download requests per file per FILE_RATE_WINDOW"),
+}
+
+
+class SettingsStore:
+    """
+    Runtime settings shared by every replica.
+
+    Values live in the settings collection and are mirrored in a dict, so
+    `get()` on hot paths never touches Mongo. Every write bumps the
+    setting's version; `reload()` (called by the CacheInvalidator when any
+    replica changes a setting) only applies values newer than the ones
+    already held, so a slow reload can't undo a more recent `set()`.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._values: Dict[str, Any] = {name: default() for name, (_, default, _) in SETTINGS.items()}
+        self._versions: Dict[str, int] = {name: 0 for name in SETTINGS}
+        self._listeners: Dict[str, List[Callable[[Any], None]]] = {}
+
+    def get(self, name: str) -> Any:
+        return self._values[name]
+
+    def items(self):
+        return self._values.items()
+
+    def on_change(self, name: str, callback: Callable[[Any], None]) -> None:
+        self._listeners.setdefault(name, []).append(callback)
+        callback(self._values[name])
+
+    async def set(self, name: str, value: Any) -> Any:
+        """Validate, persist and apply a setting; raises KeyError/ValueError on bad input."""
+        parse = SETTINGS[name][0]
+        value = parse(value)
+        version = await self.client.db.set_setting(name, value)
+        self._apply(name, value, version)
+        return value
+
+    async def reload(self) -> None:
+        for setting in await self.client.db.get_settings():
+            name = setting["_id"]
+            if name not in SETTINGS:
+                continue
+            try:
+                value = SETTINGS[name][0](setting["value"])
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Ignoring invalid setting {name}: {str(e)}")
+                continue
+            self._apply(name, value, setting.get("version", 0))
+
+    def _apply(self, name: str, value: Any, version: int) -> None:
+        if version < self._versions[name]:
+            return
+        self._versions[name] = version
+        if self._values[name] == value:
+            return
+        self._values[name] = value
+        for callback in self._listeners.get(name, []):
+            callback(value)
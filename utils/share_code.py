@@ -0,0 +1,23 @@
+import re
+import secrets
+
+import config
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+# Share keys handed out before base62 codes, e.g. 0f8e4c1a-3b2d-4e5f-8a9b-1c2d3e4f5a6b
+_LEGACY_UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+def generate_code(length: int = None) -> str:
+    """
+    A random base62 share code. At the default 8 characters there are about
+    2.2e14 codes, so collisions are rare but possible; callers insert under
+    a unique index and retry with a new code.
+    """
+    length = length or config.SHARE_CODE_LENGTH
+    return "".join(secrets.choice(ALPHABET) for _ in range(length))
+
+
+def is_legacy_uuid(key: str) -> bool:
+    return bool(_LEGACY_UUID.match(key))
@@ -0,0 +1,110 @@
+import asyncio
+from typing import Optional
+
+import aiohttp
+
+import config
+from utils.cache import TTLCache
+
+# Responses worth retrying: rate limited or a server-side failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ShortenerError(Exception):
+    """The provider rejected the URL or could not be reached."""
+
+
+class ShortenerProvider:
+    """
+    A URL shortening API. Subclasses set `name` (used to key cached
+    results) and implement `shorten()` with the session they are given.
+    """
+
+    name = "base"
+
+    async def shorten(self, session: aiohttp.ClientSession, url: str) -> str:
+        raise NotImplementedError
+
+
+class ModijiProvider(ShortenerProvider):
+    name = "modiji"
+
+    def __init__(self, api_key: str, api_url: str = None):
+        self.api_key = api_key
+        self.api_url = api_url or config.SHORTENER_API_URL
+
+    async def shorten(self, session: aiohttp.ClientSession, url: str) -> str:
+        params = {"api": self.api_key, "url": url, "format": "json"}
+        async with session.get(self.api_url, params=params) as response:
+            if response.status in RETRY_STATUSES:
+                # Raised as a ClientError so ShortenerClient retries it
+                response.raise_for_status()
+            if response.status != 200:
+                raise ShortenerError(f"HTTP {response.status}")
+            data = await response.json(content_type=None)
+        if data.get("status") != "success" or not data.get("shortenedUrl"):
+            raise ShortenerError(data.get("message") or "Failed to shorten URL")
+        return data["shortenedUrl"]
+
+
+class ShortenerClient:
+    """
+    Shortens URLs without blocking the event loop.
+
+    All requests share one aiohttp session (and so one connection pool),
+    at most `concurrency` run at a time, each attempt is bounded by
+    `timeout` and network errors are retried with exponential backoff.
+    Results are kept in memory and in the short_urls collection, so a URL
+    is only ever sent to the provider once.
+    """
+
+    def __init__(self, client, provider: ShortenerProvider, timeout: float = None, retries: int = None,
+                 concurrency: int = None):
+        self.client = client
+        self.provider = provider
+        self.timeout = timeout or config.SHORTENER_TIMEOUT
+        self.retries = retries if retries is not None else config.SHORTENER_RETRIES
+        self.concurrency = concurrency or config.SHORTENER_CONCURRENCY
+        self.cache = TTLCache(config.SHORTENER_CACHE_SIZE)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Created lazily so it binds to the running loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def shorten(self, url: str) -> str:
+        key = (self.provider.name, url)
+        short_url = self.cache.get(key)
+        if short_url:
+            return short_url
+
+        short_url = await self.client.db.get_short_url(self.provider.name, url)
+        if not short_url:
+            short_url = await self._request(url)
+            await self.client.db.save_short_url(self.provider.name, url, short_url)
+
+        self.cache.set(key, short_url, config.SHORTENER_CACHE_TTL)
+        return short_url
+
+    async def _request(self, url: str) -> str:
+        attempt = 0
+        async with self._semaphore:
+            while True:
+                try:
+                    return await self.provider.shorten(self.session, url)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    attempt += 1
+                    if attempt > self.retries:
+                        raise ShortenerError(str(e) or type(e).__name__) from e
+                    await asyncio.sleep(0.5 * 2 ** (attempt - 1))
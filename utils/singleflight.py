@@ -0,0 +1,57 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from utils.cache import TTLCache
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time.
+
+    A call for a key that is already in flight waits for that call and gets
+    its result (or exception) instead of running again. For `suppress_for`
+    seconds after a call returns a truthy result, further calls for the key
+    are answered from that result without running at all.
+    """
+
+    def __init__(self, suppress_for: float, max_keys: int = 100000):
+        self.suppress_for = suppress_for
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._recent = TTLCache(max_keys)
+        self.coalesced = 0
+        self.suppressed = 0
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, duplicate); `duplicate` is True when `func` was not run for this call."""
+        if key in self._recent:
+            self.suppressed += 1
+            return self._recent.get(key), True
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shielded so a cancelled duplicate doesn't cancel the call it is waiting on
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        # Marks the exception as retrieved when no duplicate was waiting for it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._inflight[key]
+
+        future.set_result(result)
+        if result and self.suppress_for > 0:
+            self._recent.set(key, result, self.suppress_for)
+        return result, False
+
+    def stats(self) -> Dict[str, int]:
+        return {"inflight": len(self._inflight), "coalesced": self.coalesced, "suppressed": self.suppressed}
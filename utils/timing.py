@@ -0,0 +1,148 @@
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, Optional
+
+from pyrogram import ContinuePropagation, StopPropagation, StopTransmission
+
+import config
+from utils.metrics import metrics
+
+logger = logging.getLogger("filesharebot.updates")
+
+# Control flow exceptions Pyrogram handlers raise on purpose
+PROPAGATION = (ContinuePropagation, StopPropagation, StopTransmission)
+
+
+class UpdateTiming:
+    """Where the wall time of one update went: Mongo, Telegram RPCs or the handler itself."""
+
+    __slots__ = ("handler", "started", "spans")
+
+    def __init__(self, handler: str):
+        self.handler = handler
+        self.started = time.perf_counter()
+        # (kind, method) -> [calls, seconds]
+        self.spans: Dict[tuple, list] = {}
+
+    def add(self, kind: str, method: str, seconds: float) -> None:
+        span = self.spans.get((kind, method))
+        if span is None:
+            self.spans[(kind, method)] = [1, seconds]
+        else:
+            span[0] += 1
+            span[1] += seconds
+
+    def total(self, kind: str) -> float:
+        return sum(seconds for (span_kind, _), (_, seconds) in self.spans.items() if span_kind == kind)
+
+
+_current: ContextVar[Optional[UpdateTiming]] = ContextVar("update_timing", default=None)
+# Set while a span is open so nested calls (a Database method calling another,
+# pyrogram resolving a peer inside a request) aren't counted twice
+_open_span: ContextVar[Optional[str]] = ContextVar("open_span", default=None)
+
+
+@contextmanager
+def span(kind: str, method: str):
+    timing = _current.get()
+    if timing is None or _open_span.get() is not None:
+        yield
+        return
+    token = _open_span.set(kind)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _open_span.reset(token)
+        timing.add(kind, method, time.perf_counter() - started)
+
+
+def timed_span(kind: str, method: str):
+    """Decorator form of `span` for async functions."""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(kind, method):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _describe(update: Any) -> Dict[str, Any]:
+    user = getattr(update, "from_user", None)
+    chat = getattr(update, "chat", None) or getattr(getattr(update, "message", None), "chat", None)
+    return {
+        "update": type(update).__name__,
+        "user_id": getattr(user, "id", None),
+        "chat_id": getattr(chat, "id", None),
+    }
+
+
+def time_updates(callback, handler: str = None):
+    """
+    Wrap a Pyrogram handler callback so every update it handles is timed.
+
+    One JSON log line is written per update: always when the update failed
+    or took longer than SLOW_UPDATE_MS (with the per-method breakdown), and
+    for UPDATE_LOG_SAMPLE_RATE of the rest.
+    """
+    if getattr(callback, "__timed_updates__", False):
+        return callback
+    handler = handler or callback.__name__
+
+    @wraps(callback)
+    async def wrapper(client, update, *args):
+        timing = UpdateTiming(handler)
+        token = _current.set(timing)
+        error = None
+        try:
+            return await callback(client, update, *args)
+        except PROPAGATION:
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _current.reset(token)
+            _finish(timing, update, error)
+
+    wrapper.__timed_updates__ = True
+    return wrapper
+
+
+def _finish(timing: UpdateTiming, update: Any, error: Optional[BaseException]) -> None:
+    total = time.perf_counter() - timing.started
+    mongo = timing.total("mongo")
+    telegram = timing.total("telegram")
+    metrics.inc("update_seconds_total", total, handler=timing.handler, part="total")
+    metrics.inc("update_seconds_total", mongo, handler=timing.handler, part="mongo")
+    metrics.inc("update_seconds_total", telegram, handler=timing.handler, part="telegram")
+
+    slow = total * 1000 >= config.SLOW_UPDATE_MS
+    if not (slow or error or random.random() < config.UPDATE_LOG_SAMPLE_RATE):
+        return
+
+    fields = {
+        "handler": timing.handler,
+        **_describe(update),
+        "total_ms": round(total * 1000, 2),
+        "mongo_ms": round(mongo * 1000, 2),
+        "telegram_ms": round(telegram * 1000, 2),
+        # Concurrent calls can add up to more than the wall time
+        "own_ms": round(max(0.0, total - mongo - telegram) * 1000, 2),
+    }
+    if slow or error:
+        fields["breakdown"] = [
+            {"kind": kind, "method": method, "calls": calls, "ms": round(seconds * 1000, 2)}
+            for (kind, method), (calls, seconds) in sorted(timing.spans.items(), key=lambda item: -item[1][1])
+        ]
+    if error:
+        logger.error("update failed", exc_info=error, extra={"fields": fields})
+    elif slow:
+        logger.warning("slow update", extra={"fields": fields})
+    else:
+        logger.info("update", extra={"fields": fields})
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# A user who talks to the bot again can be messaged again
+REACHABLE_USER = {"reachable": True}
+UNREACHABLE_FIELDS = {"unreachable_at": "", "unreachable_reason": "", "blocked_at": ""}
+
+
+def delivery_record(sent_at: datetime, delete_after: int = None) -> Dict[str, Any]:
+    """Fields of a deliveries document besides its (uuid, chat_id, message_id) key."""
+    return {
+        "sent_at": sent_at,
+        "delete_at": sent_at + timedelta(minutes=delete_after or 0),
+    }
+
+
+class WriteBehindBuffer:
+    """
+    Base class for in-memory write buffers that are flushed to MongoDB
+    with a single bulk_write, either every `interval` seconds or as soon as
+    `max_size` entries are pending, whichever comes first.
+    """
+
+    def __init__(self, name: str, interval: float, max_size: int):
+        self.name = name
+        self.interval = interval
+        self.max_size = max_size
+        self._pending: Dict[Any, Any] = {}
+        self._oldest: Optional[float] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.flushed_items = 0
+        self.last_flush_size = 0
+        self.last_flush_lag = 0.0
+        self.max_flush_lag = 0.0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _added(self) -> None:
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        if len(self._pending) >= self.max_size:
+            self._wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flushed_items": self.flushed_items,
+            "last_flush_size": self.last_flush_size,
+            "last_flush_lag": self.last_flush_lag,
+            "max_flush_lag": self.max_flush_lag,
+        }
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        oldest, self._oldest = self._oldest, None
+        try:
+            await self._write(pending)
+        except asyncio.CancelledError:
+            self._restore(pending)
+            raise
+        except Exception as e:
+            logger.error(f"Write Buffer Error ({self.name}): {str(e)}")
+            self._restore(pending)
+            return 0
+
+        lag = time.monotonic() - oldest if oldest is not None else 0.0
+        self.flushes += 1
+        self.flushed_items += len(pending)
+        self.last_flush_size = len(pending)
+        self.last_flush_lag = lag
+        self.max_flush_lag = max(self.max_flush_lag, lag)
+        return len(pending)
+
+    async def _write(self, pending: Dict[Any, Any]) -> None:
+        raise NotImplementedError
+
+    def _restore(self, pending: Dict[Any, Any]) -> None:
+        # Entries added while the failed flush was running are newer, keep them
+        for key, value in pending.items():
+            self._pending.setdefault(key, value)
+        self._added()
+
+
+class UserActivityBuffer(WriteBehindBuffer):
+    """
+    Buffers user upserts from /start. A user seen again within
+    `dedupe_window` seconds of the last flush is not written again.
+    """
+
+    def __init__(self, collection, interval: float, max_size: int, dedupe_window: float):
+        super().__init__("users", interval, max_size)
+        self.collection = collection
+        self.dedupe_window = dedupe_window
+        self._flushed_at: Dict[int, float] = {}
+
+    def add(self, user_id: int, username: str = None) -> None:
+        now = time.monotonic()
+        if user_id not in self._pending:
+            flushed_at = self._flushed_at.get(user_id)
+            if flushed_at is not None and now - flushed_at < self.dedupe_window:
+                return
+        self._pending[user_id] = (username, datetime.utcnow())
+        self._added()
+
+    async def _write(self, pending: Dict[int, Any]) -> None:
+        ops = [
+            UpdateOne(
+                {"user_id": user_id},
+                {
+                    "$set": {"username": username, "last_active": seen_at, **REACHABLE_USER},
+                    "$unset": UNREACHABLE_FIELDS,
+                    "$setOnInsert": {"joined_date": seen_at},
+                },
+                upsert=True,
+            )
+            for user_id, (username, seen_at) in pending.items()
+        ]
+        await self.collection.bulk_write(ops, ordered=False)
+
+        now = time.monotonic()
+        self._flushed_at = {
+            user_id: flushed_at
+            for user_id, flushed_at in self._flushed_at.items()
+            if now - flushed_at < self.dedupe_window
+        }
+        for user_id in pending:
+            self._flushed_at[user_id] = now
+
+
+class DeliveryBuffer(WriteBehindBuffer):
+    """
+    Coalesces download accounting per file: every delivery of the same uuid
+    within one tick becomes a single $inc on the file document, and the
+    delivered messages are written to the deliveries collection in one
+    bulk_write.
+    """
+
+    def __init__(self, files, deliveries, stats, stats_id: str, interval: float, max_size: int):
+        super().__init__("deliveries", interval, max_size)
+        self.files = files
+        self.deliveries = deliveries
+        self.stats_collection = stats
+        self.stats_id = stats_id
+
+    def add(self, uuid: str, chat_id: int = None, message_id: int = None, delete_after: int = None) -> None:
+        entry = self._pending.setdefault(uuid, {"downloads": 0, "messages": [], "last_download": None})
+        entry["downloads"] += 1
+        entry["last_download"] = datetime.utcnow()
+        if message_id is not None:
+            entry["messages"].append((chat_id, message_id, delivery_record(entry["last_download"], delete_after)))
+        self._added()
+
+    async def _write(self, pending: Dict[str, Any]) -> None:
+        file_ops = []
+        delivery_ops = []
+        for uuid, entry in pending.items():
+            file_ops.append(
+                UpdateOne(
+                    {"uuid": uuid},
+                    {"$inc": {"downloads": entry["downloads"]}, "$set": {"last_download": entry["last_download"]}},
+                )
+            )
+            for chat_id, message_id, record in entry["messages"]:
+                delivery_ops.append(
+                    UpdateOne(
+                        {"uuid": uuid, "chat_id": chat_id, "message_id": message_id},
+                        {"$setOnInsert": record},
+                        upsert=True,
+                    )
+                )
+        await self.files.bulk_write(file_ops, ordered=False)
+
+        # The files are already updated, so failures past this point must not re-queue them
+        try:
+            if delivery_ops:
+                await self.deliveries.bulk_write(delivery_ops, ordered=False)
+            total = sum(entry["downloads"] for entry in pending.values())
+            await self.stats_collection.update_one(
+                {"_id": self.stats_id}, {"$inc": {"total_downloads": total}}, upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Write Buffer Error ({self.name} records): {str(e)}")
+
+    def _restore(self, pending: Dict[str, Any]) -> None:
+        for uuid, entry in pending.items():
+            current = self._pending.get(uuid)
+            if current is None:
+                self._pending[uuid] = entry
+            else:
+                current["downloads"] += entry["downloads"]
+                current["messages"] = entry["messages"] + current["messages"]
+        self._added()
@@ -1,7 +1,8 @@
 import asyncio
 from aiohttp import web, ClientSession, ClientTimeout
+from utils.metrics import metrics
 
-async def start_webserver():
+async def start_webserver(bot=None):
     routes = web.RouteTableDef()
 
     @routes.get("/", allow_head=True)
@@ -11,6 +12,19 @@ async def start_webserver():
         }
         return web.json_response(res)
 
+    @routes.get("/metrics")
+    async def metrics_handler(request):
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    @routes.get("/healthz", allow_head=True)
+    async def healthz_handler(request):
+        checks = await bot.health() if bot else {}
+        healthy = bool(checks) and all(checks.values())
+        return web.json_response(
+            {"status": "ok" if healthy else "unhealthy", **checks},
+            status=200 if healthy else 503
+        )
+
     async def web_server():
         web_app = web.Application(client_max_size=30000000)
         web_app.add_routes(routes)